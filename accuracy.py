@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
-from models import get_ocr_text_from_upload, get_ocr_text_from_data, data_collection
+from models import get_ocr_text_from_upload, get_ocr_text_from_data, data_collection, upload_collection
+from bson import ObjectId
 import Levenshtein
 
 accuracy = Blueprint('accuracy', __name__)
@@ -24,11 +25,15 @@ def accuracy_route():
     max_len = max(len(original_text), len(ocr_text))
     accuracy = (1 - distance / max_len) * 100
 
+    # OCR 당시의 전처리 설정 (설정별 정확도 비교용)
+    upload = upload_collection.find_one({"_id": ObjectId(upload_id)}, {"preprocess": 1})
+    preprocess = upload.get("preprocess") if upload else None
+
     # MongoDB에 accuracy 값을 추가
     result = data_collection.update_one(
         {"upload_id": upload_id},  # 조건: 해당 upload_id를 가진 문서 찾기
-        {"$set": {"accuracy": accuracy}}  # accuracy 필드 업데이트
+        {"$set": {"accuracy": accuracy, "preprocess": preprocess}}  # accuracy 필드 업데이트
     )
 
-    return jsonify({"accuracy": accuracy, "original_text" : original_text, "ocr_text": ocr_text})
+    return jsonify({"accuracy": accuracy, "original_text" : original_text, "ocr_text": ocr_text, "preprocess": preprocess})
 
@@ -19,9 +19,15 @@ headers = {
 # 라우트 가져오기
 from extract_text import extract_text
 from summarize import summarize_and_format
-from search import search
+from search import search, sync_search_index
 from accuracy import accuracy
-from rag import rag
+from rag import rag, start_rag_indexer, warm_up_rag
+from jobs import jobs, start_job_workers
+from images import images
+from models import MAX_UPLOAD_BYTES, ensure_indexes, backfill_search_fields
+
+# 업로드 크기 제한 (폼 필드 여유분 포함, 초과 시 413)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
 
 # 라우트 등록
 app.register_blueprint(extract_text)
@@ -29,6 +35,20 @@ app.register_blueprint(summarize_and_format)
 app.register_blueprint(search)
 app.register_blueprint(accuracy)
 app.register_blueprint(rag)
+app.register_blueprint(jobs)
+app.register_blueprint(images)
+
+# MongoDB 인덱스 생성 및 기존 문서의 검색용 필드 채우기
+ensure_indexes()
+backfill_search_fields()
+sync_search_index()
+
+# 재시작 전에 끝나지 않은 문서 처리 작업 재개
+start_job_workers()
+
+# RAG 객체(임베딩, Chroma, LLM, QA 체인) 미리 생성 후 누락된 문서를 주기적으로 색인
+warm_up_rag()
+start_rag_indexer()
 
 if __name__ == '__main__':
     app.run(debug=True)
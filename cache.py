@@ -0,0 +1,366 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 잠금 없이 동작 (프로세스 하나로 실행해야 함)
+    fcntl = None
+
+
+def make_cache_key(*parts):
+    """캐시 키 생성 함수: 바이트/객체들을 순서대로 해시하여 SHA-256 문자열 반환"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            # dict 등은 키 정렬된 JSON으로 직렬화하여 항상 같은 키가 나오도록 함
+            part = json.dumps(part, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        digest.update(part)
+        digest.update(b'\x00')  # 구분자
+    return digest.hexdigest()
+
+
+class BaseCache:
+    """캐시 백엔드 공통 클래스: 조회 적중/실패 횟수를 집계"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """키에 해당하는 값을 반환, 없으면 None"""
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """키에 값을 저장 (값은 JSON으로 직렬화 가능해야 함)"""
+        self._set(key, value)
+
+    def stats(self):
+        """적중/실패 횟수와 적중률 반환"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0,
+        }
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+
+class DiskCache(BaseCache):
+    """로컬 디렉토리에 항목별 JSON 파일로 저장하는 캐시
+
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은(mtime 기준) 항목부터 삭제한다.
+    """
+
+    def __init__(self, directory, max_bytes):
+        super().__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 사용 시각 갱신 (LRU)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _set(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)  # 원자적으로 교체
+        self._evict()
+
+    def _evict(self):
+        """전체 크기가 한도를 넘으면 오래된 항목부터 삭제"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.json'):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+class MemoryCache(BaseCache):
+    """프로세스 메모리에 저장하는 LRU 캐시 (ttl초가 지난 항목은 만료)"""
+
+    def __init__(self, max_entries, ttl=None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (만료 시각, 값)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)  # 최근 사용으로 갱신
+            return value
+
+    def _set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # 가장 오래 사용되지 않은 항목 삭제
+
+
+class SQLiteCache(BaseCache):
+    """SQLite 파일에 저장하는 LRU 캐시 (프로세스 재시작 후에도 유지, ttl초가 지난 항목은 만료)"""
+
+    def __init__(self, path, max_entries, ttl=None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access)")
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def _set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, now),
+            )
+            # 한도를 넘은 만큼 가장 오래 사용되지 않은 항목 삭제
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+class VectorCache(BaseCache):
+    """float32 벡터 캐시: 벡터는 하나의 원시 배열 파일(vectors.f32)에 이어 붙이고, 키별 위치는 SQLite에 기록
+
+    벡터 하나당 dim * 4바이트만 사용하며, 같은 키는 한 번만 저장한다 (삭제/만료 없음).
+    여러 프로세스가 같은 디렉토리를 쓸 수 있도록 파일 끝 위치 확인, 추가, 위치 기록은 vectors.f32의 fcntl 잠금 안에서 한다.
+    """
+
+    def __init__(self, directory):
+        super().__init__()
+        os.makedirs(directory, exist_ok=True)
+        self._data = open(os.path.join(directory, "vectors.f32"), "a+b")
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                "key TEXT PRIMARY KEY, offset INTEGER NOT NULL, dim INTEGER NOT NULL)"
+            )
+
+    def get_many(self, keys):
+        """키 목록에 해당하는 벡터(numpy float32 배열) 목록 반환, 없는 키는 None"""
+        values = self._read_many(keys)
+        with self._lock:
+            for value in values:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        return values
+
+    def set_many(self, keys, vectors):
+        """키 목록과 같은 순서의 벡터들을 저장"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._data.fileno(), fcntl.LOCK_EX)
+            try:
+                with self._conn:
+                    self._data.seek(0, os.SEEK_END)
+                    offset = self._data.tell() // 4
+                    self._data.write(vectors.tobytes())
+                    self._data.flush()
+                    dim = vectors.shape[1]
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO vectors (key, offset, dim) VALUES (?, ?, ?)",
+                        [(key, offset + i * dim, dim) for i, key in enumerate(keys)],
+                    )
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._data.fileno(), fcntl.LOCK_UN)
+
+    def _read_many(self, keys):
+        rows = {}
+        with self._lock:
+            # SQLite 변수 개수 제한을 넘지 않도록 나누어 조회
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, offset, dim in self._conn.execute(
+                    f"SELECT key, offset, dim FROM vectors WHERE key IN ({placeholders})", chunk
+                ):
+                    rows[key] = (offset, dim)
+
+            values = []
+            for key in keys:
+                row = rows.get(key)
+                if row is None:
+                    values.append(None)
+                    continue
+                offset, dim = row
+                self._data.seek(offset * 4)
+                values.append(np.frombuffer(self._data.read(dim * 4), dtype=np.float32))
+        return values
+
+    def _get(self, key):
+        return self._read_many([key])[0]
+
+    def _set(self, key, value):
+        self.set_many([key], [value])
+
+
+class SemanticCache(BaseCache):
+    """임베딩 벡터로 조회하는 LRU 캐시 (ttl초가 지난 항목은 만료)
+
+    저장된 벡터 중 scope가 같고 코사인 유사도가 threshold 이상인 가장 가까운 항목의 값을 반환한다.
+    항목마다 tags(예: 답변의 출처 문서 ID)를 달아 두면 invalidate(tag)로 해당 항목들을 삭제할 수 있다.
+    """
+
+    def __init__(self, max_entries, threshold, ttl=None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.invalidations = 0
+        self._entries = OrderedDict()  # 항목 번호 -> (정규화된 벡터, scope, tags, 만료 시각, 값)
+        self._next_id = 0
+        self._matrix = None  # 조회용으로 쌓아 둔 (항목 번호 목록, 벡터 행렬), 항목이 바뀌면 다시 만듦
+
+    def get(self, vector, scope=None):
+        """유사한 벡터로 저장된 값과 유사도 반환, 없으면 (None, 최고 유사도)"""
+        vector = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            self._remove_expired(now)
+            best_id = None
+            best_similarity = 0.0
+            if self._entries:
+                if self._matrix is None:
+                    entry_ids = list(self._entries)
+                    self._matrix = (entry_ids, np.stack([self._entries[entry_id][0] for entry_id in entry_ids]))
+                entry_ids, matrix = self._matrix
+                similarities = matrix @ vector
+                for index in np.argsort(-similarities):
+                    if self._entries[entry_ids[index]][1] == scope:
+                        best_id = entry_ids[index]
+                        best_similarity = float(similarities[index])
+                        break
+
+            if best_id is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None, best_similarity
+
+            self.hits += 1
+            self._entries.move_to_end(best_id)  # 최근 사용으로 갱신
+            return self._entries[best_id][4], best_similarity
+
+    def set(self, vector, value, scope=None, tags=()):
+        """벡터에 값을 저장"""
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[self._next_id] = (self._normalize(vector), scope, frozenset(tags), expires_at, value)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # 가장 오래 사용되지 않은 항목 삭제
+            self._matrix = None
+
+    def invalidate(self, tags):
+        """tags 중 하나라도 달린 항목 삭제"""
+        tags = set(tags)
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items() if entry[2] & tags]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            if stale:
+                self.invalidations += len(stale)
+                self._matrix = None
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"entries": len(self._entries), "invalidations": self.invalidations})
+        return stats
+
+    def _remove_expired(self, now):
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry[3] is not None and entry[3] < now]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._matrix = None
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,110 @@
+import os
+import re
+
+# RAG 청크 최대 길이와 이전 청크와 겹치는 길이 (글자 수)
+RAG_CHUNK_CHARS = int(os.getenv("RAG_CHUNK_CHARS", "1000"))
+RAG_CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "150"))
+
+# OCR 텍스트의 페이지 구분자 줄 ('=== 페이지 N ===')
+PAGE_HEADER_PATTERN = re.compile(r'^=== 페이지 (\d+) ===$', re.MULTILINE)
+# extract_text_with_layout은 수직 간격이 큰 곳에 빈 줄을 넣으므로 빈 줄을 문단 경계로 사용
+PARAGRAPH_BREAK_PATTERN = re.compile(r'\n[ \t]*\n')
+
+
+def split_pages(text):
+    """OCR 텍스트를 (페이지 번호, 시작 위치, 끝 위치) 목록으로 나눔 (구분자가 없으면 1페이지 하나)"""
+    headers = list(PAGE_HEADER_PATTERN.finditer(text))
+    if not headers:
+        return [(1, 0, len(text))]
+
+    pages = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        pages.append((int(header.group(1)), header.end(), end))
+    return pages
+
+
+def strip_span(text, start, end):
+    """[start, end) 구간의 앞뒤 공백을 제외한 구간 반환"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def split_units(text, start, end, max_chars):
+    """페이지 구간을 문단 단위 구간으로 나눔 (max_chars를 넘는 문단은 줄 단위, 그래도 길면 글자 단위)"""
+    boundaries = [start]
+    for match in PARAGRAPH_BREAK_PATTERN.finditer(text, start, end):
+        boundaries += [match.start(), match.end()]
+    boundaries.append(end)
+
+    units = []
+    for paragraph_start, paragraph_end in zip(boundaries[::2], boundaries[1::2]):
+        paragraph_start, paragraph_end = strip_span(text, paragraph_start, paragraph_end)
+        if paragraph_start == paragraph_end:
+            continue
+        if paragraph_end - paragraph_start <= max_chars:
+            units.append((paragraph_start, paragraph_end))
+            continue
+
+        line_start = paragraph_start
+        while line_start < paragraph_end:
+            line_end = text.find('\n', line_start, paragraph_end)
+            line_end = paragraph_end if line_end == -1 else line_end + 1
+            for window_start in range(line_start, line_end, max_chars):
+                span = strip_span(text, window_start, min(window_start + max_chars, line_end))
+                if span[0] < span[1]:
+                    units.append(span)
+            line_start = line_end
+    return units
+
+
+def overlap_start(text, chunk_start, chunk_end, overlap):
+    """다음 청크가 시작할 위치: 이전 청크의 끝 overlap 글자 안에서 처음 나오는 줄/단어 경계 다음"""
+    if overlap <= 0:
+        return chunk_end
+    tail_start = max(chunk_start + 1, chunk_end - overlap)
+    for position in range(tail_start, chunk_end):
+        if text[position - 1].isspace() and not text[position].isspace():
+            return position
+    return chunk_end
+
+
+def chunk_text(text, max_chars=RAG_CHUNK_CHARS, overlap=RAG_CHUNK_OVERLAP):
+    """OCR 텍스트를 페이지/문단 경계에 맞춘 청크 목록으로 나눔
+
+    각 청크는 {"text", "page", "start", "end"}이며 text == 원문[start:end]이다.
+    청크는 페이지를 넘지 않고, 같은 페이지의 다음 청크는 이전 청크 끝의 overlap 글자 정도를 다시 포함한다.
+    """
+    chunks = []
+    for page, page_start, page_end in split_pages(text):
+        chunk_start = chunk_end = None
+        for unit_start, unit_end in split_units(text, page_start, page_end, max_chars):
+            if chunk_start is not None and unit_end - chunk_start > max_chars:
+                chunks.append({"text": text[chunk_start:chunk_end], "page": page, "start": chunk_start, "end": chunk_end})
+                chunk_start = overlap_start(text, chunk_start, chunk_end, overlap)
+                if unit_end - chunk_start > max_chars:
+                    chunk_start = unit_start  # 겹치는 부분까지 넣으면 한도를 넘는 경우
+            if chunk_start is None:
+                chunk_start = unit_start
+            chunk_end = unit_end
+        if chunk_start is not None:
+            chunks.append({"text": text[chunk_start:chunk_end], "page": page, "start": chunk_start, "end": chunk_end})
+    return chunks
+
+
+def merge_chunk_spans(chunks):
+    """같은 문서의 청크들 ({"text", "start", "end"})을 원문 순서로 정렬하고 겹치거나 이어지는 청크를 하나의 구간으로 합침"""
+    merged = []
+    for chunk in sorted(chunks, key=lambda chunk: chunk["start"]):
+        if merged and chunk["start"] <= merged[-1]["end"]:
+            last = merged[-1]
+            if chunk["end"] > last["end"]:
+                last["text"] += chunk["text"][last["end"] - chunk["start"]:]
+                last["end"] = chunk["end"]
+            last["pages"].add(chunk["page"])
+        else:
+            merged.append({"text": chunk["text"], "start": chunk["start"], "end": chunk["end"], "pages": {chunk["page"]}})
+    return merged
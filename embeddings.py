@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+
+import http_client
+from cache import VectorCache, make_cache_key
+from models import headers
+
+# 임베딩 모델 (기존 Chroma 저장소와 같은 모델이어야 함)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+# 한 번의 요청에 넣을 최대 텍스트 수와 토큰 수 (API 한도: 2048개, 300,000토큰)
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "512"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "200000"))
+# 동시에 보낼 임베딩 요청 수
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "4"))
+
+# (모델, 텍스트) 해시를 키로 하는 디스크 벡터 캐시
+embedding_cache = VectorCache(os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache"))
+embedding_executor = ThreadPoolExecutor(max_workers=EMBEDDING_MAX_WORKERS)
+
+
+def estimate_tokens(text):
+    """텍스트의 토큰 수 상한 (BPE 토큰은 최소 1바이트이므로 UTF-8 바이트 수를 사용)"""
+    return len(text.encode('utf-8'))
+
+
+def make_batches(texts):
+    """텍스트 목록을 요청당 개수/토큰 한도에 맞게 나눈 인덱스 목록 생성"""
+    batch = []
+    batch_tokens = 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= EMBEDDING_BATCH_MAX_ITEMS or batch_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def request_embeddings(texts, model):
+    """텍스트 여러 개를 한 번의 API 요청으로 임베딩"""
+    data = {
+        "input": texts,
+        "model": model,
+        "encoding_format": "float"
+    }
+    response = http_client.post("openai", f"{http_client.OPENAI_API_BASE}/embeddings", headers=headers, json=data)
+    response.raise_for_status()  # 응답 오류가 있는 경우 예외 발생
+    # 응답 순서가 입력 순서와 같다는 보장이 없으므로 index로 정렬
+    return [item['embedding'] for item in sorted(response.json()['data'], key=lambda item: item['index'])]
+
+
+def embed_texts(texts, model=EMBEDDING_MODEL):
+    """텍스트 목록의 임베딩 반환 (캐시에 없는 텍스트만 배치로 나누어 동시에 요청)"""
+    keys = [make_cache_key(model, text) for text in texts]
+    vectors = embedding_cache.get_many(keys)
+
+    # 캐시에 없는 텍스트 (같은 텍스트는 한 번만 요청)
+    missing = {}
+    for key, text, vector in zip(keys, texts, vectors):
+        if vector is None:
+            missing.setdefault(key, text)
+
+    if missing:
+        missing_keys = list(missing)
+        missing_texts = [missing[key] for key in missing_keys]
+        batches = list(make_batches(missing_texts))
+        futures = [
+            embedding_executor.submit(request_embeddings, [missing_texts[i] for i in batch], model)
+            for batch in batches
+        ]
+
+        computed = {}
+        for batch, future in zip(batches, futures):
+            batch_keys = [missing_keys[i] for i in batch]
+            batch_vectors = future.result()
+            embedding_cache.set_many(batch_keys, batch_vectors)
+            computed.update(zip(batch_keys, batch_vectors))
+
+        vectors = [computed[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+
+    return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
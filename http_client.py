@@ -0,0 +1,116 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+load_dotenv()  # 환경 변수 로드
+
+# OpenAI API 주소 (로컬 테스트 서버로 바꿔서 사용할 수 있음)
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+
+# 연결/응답 타임아웃 (초)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+
+# 호스트별 keep-alive 연결 풀 크기
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+
+# 재시도 설정: 지수 백오프(+지터)로 최대 HTTP_MAX_RETRIES번 재시도
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "20"))
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# 공급자별 초당 요청 수 제한
+PROVIDER_RATE_LIMITS = {
+    "openai": float(os.getenv("OPENAI_RATE_LIMIT", "10")),
+    "clova": float(os.getenv("CLOVA_RATE_LIMIT", "5")),
+}
+
+
+class RateLimiter:
+    """토큰 버킷 방식의 요청 속도 제한기 (초당 rate개, 최대 rate개까지 몰아서 허용)"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """요청 하나를 보낼 수 있을 때까지 대기"""
+        if self.rate <= 0:
+            return  # 0 이하이면 제한 없음
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_sessions = {}
+_rate_limiters = {}
+_lock = threading.Lock()
+
+
+def get_session(provider):
+    """공급자별로 공유되는 requests 세션 반환 (연결 재사용)"""
+    with _lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            # 재시도는 post()에서 직접 처리하므로 어댑터 재시도는 끔
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+            _rate_limiters[provider] = RateLimiter(PROVIDER_RATE_LIMITS.get(provider, 0))
+        return session
+
+
+def backoff_delay(attempt, retry_after=None):
+    """attempt번째 재시도 전 대기 시간 계산 (full jitter, Retry-After 헤더 우선)"""
+    delay = random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+    if retry_after:
+        try:
+            delay = max(delay, min(HTTP_BACKOFF_MAX, float(retry_after)))
+        except ValueError:
+            pass  # 날짜 형식의 Retry-After는 무시
+    return delay
+
+
+def post(provider, url, **kwargs):
+    """공급자별 세션/속도 제한을 적용하여 POST 요청, 재시도 가능한 오류는 백오프 후 재시도
+
+    재시도를 모두 소진하면 마지막 응답을 그대로 반환하며, 연결 오류는 예외로 전달된다.
+    """
+    session = get_session(provider)
+    rate_limiter = _rate_limiters[provider]
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        try:
+            response = session.post(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == HTTP_MAX_RETRIES:
+                raise
+            print(f"{provider} 요청 실패 ({str(e)}), 재시도 {attempt + 1}/{HTTP_MAX_RETRIES}")
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code not in RETRYABLE_STATUSES or attempt == HTTP_MAX_RETRIES:
+            return response
+
+        print(f"{provider} 응답 {response.status_code}, 재시도 {attempt + 1}/{HTTP_MAX_RETRIES}")
+        time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
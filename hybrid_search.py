@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+
+from langchain.schema import Document
+from models import normalize_search_text
+from search_index import search_index
+
+# 키워드 검색에서 청크를 가져올 최대 문서 수
+HYBRID_LEXICAL_MAX_DOCS = int(os.getenv("HYBRID_LEXICAL_MAX_DOCS", "50"))
+# Reciprocal Rank Fusion 상수 (순위가 낮은 결과의 영향을 줄이는 값)
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# 키워드 검색과 벡터 검색을 동시에 실행하기 위한 풀
+retrieval_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HYBRID_MAX_WORKERS", "8")))
+
+
+def chunk_id(document):
+    """청크 Document의 Chroma ID ('data _id:청크 번호')"""
+    return f"{document.metadata.get('data_id')}:{document.metadata.get('chunk_index')}"
+
+
+def metadata_filter(filters=None, data_ids=None):
+    """검색 조건을 Chroma 메타데이터 where 조건으로 변환 (조건이 없으면 None)
+
+    filters: {"start_ts", "end_ts": 업로드 시각 범위, "data_ids": 허용할 data _id 목록, "doc_type": 문서 종류}
+    data_ids가 주어지면 filters의 data_ids 대신 사용한다.
+    """
+    filters = filters or {}
+    conditions = []
+    if filters.get("start_ts") is not None:
+        conditions.append({"upload_ts": {"$gte": filters["start_ts"]}})
+    if filters.get("end_ts") is not None:
+        conditions.append({"upload_ts": {"$lt": filters["end_ts"]}})
+    if data_ids is None:
+        data_ids = filters.get("data_ids")
+    if data_ids is not None:
+        conditions.append({"data_id": {"$in": list(data_ids)}})
+    if filters.get("doc_type"):
+        conditions.append({"doc_type": filters["doc_type"]})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def query_terms(query):
+    """질문에서 키워드 검색에 쓸 단어 목록 (두 글자 이상)"""
+    return sorted({term for term in normalize_search_text(query).split(' ') if len(term) >= 2})
+
+
+def term_documents(term, start_ts=None, end_ts=None):
+    """단어가 들어 있을 수 있는 문서 _id 목록 (조사가 붙은 단어는 끝 글자를 떼고 다시 찾음)"""
+    data_ids = search_index.search([term], start_ts, end_ts)
+    if not data_ids and len(term) >= 3:
+        term = term[:-1]
+        data_ids = search_index.search([term], start_ts, end_ts)
+    return term, data_ids
+
+
+def lexical_search(chroma_db, query, k, filters=None):
+    """로컬 n-gram 인덱스로 후보 문서를 찾고, 그 문서들의 청크를 질문 단어 등장 횟수(IDF 가중)로 정렬하여 상위 k개 반환"""
+    filters = filters or {}
+    allowed_ids = filters.get("data_ids")
+    if allowed_ids is not None:
+        allowed_ids = set(allowed_ids)
+        if not allowed_ids:
+            return []
+
+    total = max(len(search_index), 1)
+    weights = {}  # 단어 -> IDF
+    document_scores = {}
+    for term in query_terms(query):
+        term, data_ids = term_documents(term, filters.get("start_ts"), filters.get("end_ts"))
+        if not data_ids:
+            continue
+        weights[term] = math.log(1 + total / len(data_ids))
+        for data_id in data_ids:
+            if allowed_ids is None or data_id in allowed_ids:
+                document_scores[data_id] = document_scores.get(data_id, 0) + weights[term]
+
+    if not document_scores:
+        return []
+
+    # 많은 단어를 가진 문서부터 일부만 청크를 가져와 점수 계산
+    candidates = sorted(document_scores, key=document_scores.get, reverse=True)[:HYBRID_LEXICAL_MAX_DOCS]
+    # 문서 종류 조건은 청크 메타데이터로 적용
+    entries = chroma_db.get(
+        where=metadata_filter({"doc_type": filters.get("doc_type")}, candidates), include=["documents", "metadatas"]
+    )
+
+    scored = []
+    for text, metadata in zip(entries["documents"], entries["metadatas"]):
+        normalized = normalize_search_text(text)
+        score = sum(weight * normalized.count(term) for term, weight in weights.items())
+        if score > 0:
+            scored.append((score, Document(page_content=text, metadata=metadata)))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [document for _, document in scored[:k]]
+
+
+def vector_search(chroma_db, query, k, filters=None):
+    """벡터 유사도 상위 k개 청크 (업로드 시각, 파일명, 문서 종류 조건은 Chroma에서 먼저 적용)"""
+    if filters and filters.get("data_ids") is not None and not filters["data_ids"]:
+        return []  # 파일명 조건에 맞는 문서가 없음
+    return chroma_db.similarity_search(query, k=k, filter=metadata_filter(filters))
+
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """여러 검색 결과 순위를 RRF(1 / (k + 순위)의 합)로 합친 Document 목록"""
+    scores = {}
+    documents = {}
+    for ranked in ranked_lists:
+        for rank, document in enumerate(ranked, start=1):
+            key = chunk_id(document)
+            scores[key] = scores.get(key, 0) + 1 / (k + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def hybrid_search(chroma_db, query, k, fetch_k, filters=None):
+    """키워드 검색과 벡터 검색을 동시에 실행하고 RRF로 합친 상위 k개 청크 반환 (filters는 metadata_filter 참고)"""
+    lexical = retrieval_executor.submit(lexical_search, chroma_db, query, fetch_k, filters)
+    vector = retrieval_executor.submit(vector_search, chroma_db, query, fetch_k, filters)
+    return reciprocal_rank_fusion([vector.result(), lexical.result()])[:k]
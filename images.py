@@ -0,0 +1,48 @@
+from flask import Blueprint, Response, request, jsonify
+from werkzeug.wsgi import wrap_file
+from models import fs, get_thumbnail_id
+from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
+import os
+
+images = Blueprint('images', __name__)
+
+# GridFS 이미지는 ID별로 내용이 바뀌지 않으므로 브라우저가 오래 캐시해도 됨 (초)
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(30 * 24 * 60 * 60)))
+
+def send_gridfs_file(file_id):
+    """GridFS 파일을 스트리밍 응답으로 반환 (ETag/Last-Modified/Range/Cache-Control 지원)"""
+    grid_out = fs.get(file_id)
+
+    response = Response(
+        wrap_file(request.environ, grid_out),
+        mimetype=grid_out.content_type or "image/jpeg",
+        direct_passthrough=True,
+    )
+    response.content_length = grid_out.length
+    response.last_modified = grid_out.upload_date
+    response.set_etag(str(file_id))
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_CACHE_MAX_AGE
+    response.cache_control.immutable = True
+
+    # If-None-Match/If-Modified-Since는 304로, Range 요청은 206 부분 응답으로 처리
+    return response.make_conditional(request, accept_ranges=True, complete_length=grid_out.length)
+
+@images.route('/image/<image_id>', methods=['GET'])
+def image_route(image_id):
+    try:
+        return send_gridfs_file(ObjectId(image_id))
+    except (InvalidId, NoFile):
+        return jsonify({"error": "이미지를 찾을 수 없습니다."}), 404
+
+@images.route('/image/<image_id>/thumbnail', methods=['GET'])
+def thumbnail_route(image_id):
+    try:
+        thumbnail_id = get_thumbnail_id(ObjectId(image_id))
+        if thumbnail_id is None:
+            raise NoFile(image_id)
+        return send_gridfs_file(thumbnail_id)
+    except (InvalidId, NoFile):
+        return jsonify({"error": "이미지를 찾을 수 없습니다."}), 404
@@ -0,0 +1,199 @@
+from flask import Blueprint, jsonify
+from models import db, extract_document, parse_page_range, get_ocr_text_from_upload, spool_upload
+from bson import ObjectId
+from bson.errors import InvalidId
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import os
+import socket
+import threading
+import time
+
+jobs = Blueprint('jobs', __name__)
+
+job_collection = db['jobs']  # 문서 처리 작업 컬렉션
+
+# 업로드 파일을 작업이 끝날 때까지 보관하는 디렉토리
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", "job_uploads")
+# 동시에 처리할 최대 문서 수
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# 실행 중인 작업의 updated_at이 이 시간(초) 넘게 갱신되지 않으면 처리하던 프로세스가 죽은 것으로 보고 다시 대기열에 넣음
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+# 실행 중인 작업의 updated_at을 갱신하는 주기 (초)
+JOB_HEARTBEAT_INTERVAL = max(JOB_LEASE_SECONDS // 4, 1)
+
+# 작업을 가져간 프로세스 식별자 (디버그 리로더나 여러 워커 프로세스가 같은 컬렉션을 공유하므로 구분)
+JOB_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+job_executor = None
+job_executor_lock = threading.Lock()
+
+def enqueue_job(file, page_range):
+    """업로드 파일을 디스크에 보관하고 작업을 등록한 뒤 작업 ID를 반환하는 함수"""
+    os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+    job_id = ObjectId()
+    upload_path = os.path.join(JOB_UPLOAD_DIR, str(job_id))
+    spool_upload(file, upload_path)  # 청크 단위로 디스크에 저장 (크기 한도 초과 시 예외)
+
+    now = datetime.now()
+    job_collection.insert_one({
+        "_id": job_id,
+        "status": "queued",
+        "filename": file.filename,
+        "content_type": file.content_type,
+        "page_range": page_range,
+        "upload_path": upload_path,
+        "owner": None,
+        "pages_total": None,
+        "pages_done": 0,
+        "completed_pages": [],
+        "upload_id": None,
+        "confidence": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    })
+    submit_job(job_id)
+    return str(job_id)
+
+def submit_job(job_id):
+    """작업을 워커 풀에 제출"""
+    global job_executor
+    with job_executor_lock:
+        if job_executor is None:
+            job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS)
+    job_executor.submit(run_job, job_id)
+
+def run_job(job_id):
+    """작업 하나를 처리하는 워커 함수"""
+    # 대기 중인 작업만 가져와 실행 상태로 변경 (이미 다른 워커/프로세스가 가져간 작업은 건너뜀)
+    job = job_collection.find_one_and_update(
+        {"_id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "owner": JOB_OWNER, "updated_at": datetime.now()}},
+    )
+    if job is None:
+        return
+
+    # 처리하는 동안 주기적으로 updated_at을 갱신하여 다른 프로세스가 작업을 다시 가져가지 않도록 함
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                job_collection.update_one(
+                    {"_id": job_id, "status": "running", "owner": JOB_OWNER},
+                    {"$set": {"updated_at": datetime.now()}},
+                )
+            except Exception as e:
+                # 일시적인 DB 오류로 스레드가 끝나면 임대가 만료되어 같은 작업이 다시 실행되므로 계속 시도
+                print(f"Error in job {job_id} heartbeat: {str(e)}")
+
+    threading.Thread(target=heartbeat, name=f"job-heartbeat-{job_id}", daemon=True).start()
+
+    def on_page(page_number, pages_done, pages_total):
+        job_collection.update_one(
+            {"_id": job_id},
+            {
+                "$set": {"pages_done": pages_done, "pages_total": pages_total, "updated_at": datetime.now()},
+                "$push": {"completed_pages": page_number},
+            },
+        )
+
+    # 이 프로세스가 아직 작업의 소유자인 경우에만 결과를 기록 (임대가 만료되어 다른 프로세스가 가져갔으면 덮어쓰지 않음)
+    owned = {"_id": job_id, "status": "running", "owner": JOB_OWNER}
+    reclaimed = False
+
+    try:
+        page_range = job.get("page_range")
+        pages_to_process = parse_page_range(page_range) if page_range else None
+
+        result = extract_document(job["upload_path"], job["filename"], job["content_type"], pages_to_process, on_page)
+
+        updated = job_collection.update_one(
+            owned,
+            {"$set": {
+                "status": "done",
+                "upload_id": result["upload_id"],
+                "confidence": result["confidence"],
+                "cache_hits": result["cache_hits"],
+                "updated_at": datetime.now(),
+            }},
+        )
+        reclaimed = updated.matched_count == 0
+    except Exception as e:
+        print(f"Error in job {job_id}: {str(e)}")
+        updated = job_collection.update_one(
+            owned,
+            {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.now()}},
+        )
+        reclaimed = updated.matched_count == 0
+    finally:
+        stop_heartbeat.set()
+        if reclaimed:
+            # 다른 프로세스가 다시 처리 중이므로 업로드 파일을 남겨 둠
+            print(f"Job {job_id} was reclaimed by another worker; result discarded")
+        else:
+            # 성공/실패와 관계없이 끝난 작업의 업로드 파일 삭제
+            try:
+                os.remove(job["upload_path"])
+            except OSError:
+                pass
+
+def requeue_expired_jobs():
+    """임대 시간이 지난 실행 중 작업(처리하던 프로세스가 죽은 작업)을 대기열로 되돌리고, 대기 중인 작업을 워커 풀에 제출
+
+    다른 프로세스가 처리 중인 작업은 updated_at이 계속 갱신되므로 건드리지 않는다.
+    대기 중인 작업은 여러 프로세스가 제출해도 run_job에서 한 곳만 가져간다.
+    """
+    expired_before = datetime.now() - timedelta(seconds=JOB_LEASE_SECONDS)
+    job_collection.update_many(
+        {"status": "running", "updated_at": {"$lt": expired_before}},
+        {"$set": {
+            "status": "queued", "owner": None, "pages_done": 0, "completed_pages": [], "updated_at": datetime.now(),
+        }},
+    )
+    for job in job_collection.find({"status": "queued"}, {"_id": 1}).sort("created_at", 1):
+        submit_job(job["_id"])
+
+def start_job_workers():
+    """앱 시작 시 호출: 끝나지 않은 작업을 다시 제출하고, 이후에도 임대 시간이 지난 작업을 주기적으로 회수"""
+    requeue_expired_jobs()
+
+    def run():
+        while True:
+            time.sleep(JOB_LEASE_SECONDS)
+            try:
+                requeue_expired_jobs()
+            except Exception as e:
+                print(f"Error in requeue_expired_jobs: {str(e)}")
+
+    threading.Thread(target=run, name="job-reaper", daemon=True).start()
+
+@jobs.route('/jobs/<job_id>', methods=['GET'])
+def job_status_route(job_id):
+    try:
+        job = job_collection.find_one({"_id": ObjectId(job_id)})
+    except InvalidId:
+        job = None
+
+    if not job:
+        return jsonify({"error": "작업을 찾을 수 없습니다."}), 404
+
+    response = {
+        "job_id": job_id,
+        "status": job["status"],
+        "filename": job["filename"],
+        "pages_total": job["pages_total"],
+        "pages_done": job["pages_done"],
+        "completed_pages": sorted(job["completed_pages"]),
+        "upload_id": job["upload_id"],
+        "confidence": job["confidence"],
+        "error": job["error"],
+    }
+
+    # 완료된 작업은 OCR 결과도 함께 반환
+    if job["status"] == "done" and job["upload_id"]:
+        response["html"] = get_ocr_text_from_upload(job["upload_id"])
+        response["cache_hits"] = job.get("cache_hits", [])
+
+    return jsonify(response)
@@ -1,26 +1,34 @@
 from pymongo import MongoClient
-import requests
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import gridfs
 import os
 from dotenv import load_dotenv
 import fitz
 import io
-from PIL import Image, ImageEnhance
+from PIL import Image
 import base64
 from bson import ObjectId
 import uuid
 import time
 import json
+import hashlib
+import re
+import tempfile
+import threading
 import pandas as pd
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from cache import DiskCache, MemoryCache, SQLiteCache, make_cache_key
+import http_client
+from preprocess import preprocess_image as run_preprocess
 
 load_dotenv()  # 환경 변수 로드
 
 
 # 클로바 OCR
 secret_key = os.getenv("api")
-api_url = 'https://mfpxhmwxm2.apigw.ntruss.com/custom/v1/35426/9ce749152d8f697b1dde8d90136d7443f3ee7b7038574145809c266e3f416d80/general'
+api_url = os.getenv("CLOVA_API_URL", 'https://mfpxhmwxm2.apigw.ntruss.com/custom/v1/35426/9ce749152d8f697b1dde8d90136d7443f3ee7b7038574145809c266e3f416d80/general')
 
 # MongoDB Atlas 연결 설정
 MONGO_URI = os.getenv("MONGODB_URL")
@@ -32,48 +40,112 @@ fs = gridfs.GridFS(db)  # GridFS 객체 생성
 
 api_key = os.getenv("api_key")
 
+# 동시에 처리할 최대 페이지 수 (OCR 워커 풀 크기)
+OCR_MAX_IN_FLIGHT = int(os.getenv("OCR_MAX_IN_FLIGHT", "4"))
+
+# 업로드 파일 설정: 임시 저장 디렉토리(없으면 시스템 기본), 최대 크기, 저장 시 읽는 청크 크기
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# 검색 결과 미리보기 썸네일의 긴 변 길이 (px)
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))
+
+# 한 번의 클로바 OCR 요청에 담을 최대 이미지 수와 요청 크기
+# (클로바 OCR General API는 현재 요청당 이미지 1장만 인식하므로 기본값은 1)
+CLOVA_BATCH_SIZE = max(1, int(os.getenv("CLOVA_BATCH_SIZE", "1")))
+CLOVA_MAX_REQUEST_BYTES = int(os.getenv("CLOVA_MAX_REQUEST_BYTES", str(50 * 1024 * 1024)))
+
+# 긴 문서 요약 설정: 한 번의 요약 요청에 넣을 최대 글자 수와 동시 요청 수
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "6000"))
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "4"))
+# 부분 요약을 다시 요약하는 최대 반복 횟수
+SUMMARY_MAX_ROUNDS = int(os.getenv("SUMMARY_MAX_ROUNDS", "3"))
+summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_MAX_WORKERS)
+
+# 검색 후보를 찾는 방식: local(로컬 n-gram 역색인, search_index.py) 또는 mongo(search_ngrams 인덱스)
+# search_ngrams 필드와 인덱스는 mongo 방식에서만 만들고 저장함
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "local")
+
+# 연속된 공백 문자 (검색용 텍스트 정규화)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# OCR 텍스트의 페이지 구분자 ('=== 페이지 N ===')
+PAGE_MARKER_PATTERN = re.compile(r'(?=^=== 페이지 \d+ ===$)', re.MULTILINE)
+
+# 이미지 전처리 설정 (OCR 캐시 키에 포함되므로 값이 바뀌면 캐시도 새로 쌓임)
+PREPROCESS_RESIZE = os.getenv("PREPROCESS_RESIZE", "auto")  # 'auto' 또는 고정 배율 (예: 2)
+PREPROCESS_PARAMS = {
+    "contrast": 2,
+    "resize": PREPROCESS_RESIZE if PREPROCESS_RESIZE == "auto" else float(PREPROCESS_RESIZE),
+    "sharpness": 2,
+    "binarize": os.getenv("PREPROCESS_BINARIZE", "0") == "1",  # 평균값 기준 이진화
+    # 'auto' 배율: 추정 DPI가 target_dpi가 되도록 확대/축소 (media/ 샘플 기준 기존 2배 확대와 비슷한 값)
+    "target_dpi": int(os.getenv("PREPROCESS_TARGET_DPI", "240")),
+    "text_height_pt": 5.4,  # 본문 글자 조각 높이의 중앙값 (pt)
+    "default_scale": 2,  # 글자를 찾지 못했을 때의 배율
+    "min_scale": 0.5,
+    "max_scale": 3,
+    # 클로바 OCR에 보낼 이미지 크기 제한
+    "max_side": int(os.getenv("CLOVA_MAX_IMAGE_SIDE", "6000")),
+    "max_pixels": int(os.getenv("CLOVA_MAX_IMAGE_PIXELS", str(30_000_000))),
+}
+
+# 전처리 결과를 processed_image/output_image.png로 저장할지 여부 (디버그용)
+SAVE_PREPROCESSED_IMAGE = os.getenv("SAVE_PREPROCESSED_IMAGE", "0") == "1"
+
+# OCR 결과 캐시 (전처리된 이미지 해시 기준, 로컬 디스크에 저장)
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "ocr_cache")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+ocr_cache = DiskCache(OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES)
+
+# 디버그용 결과 파일은 여러 페이지가 동시에 쓰므로 잠금으로 보호
+debug_output_lock = threading.Lock()
+
 headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
         }
 
-def call_gpt_api(payload):
-    # GPT-4o mini API로 OCR 요청
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        response.raise_for_status()  # 응답 상태 코드 확인
-        return response.json()['choices'][0]['message']['content'].strip()
-
+# GPT 응답 캐시 (memory 또는 sqlite 백엔드)
+GPT_CACHE_BACKEND = os.getenv("GPT_CACHE_BACKEND", "memory")
+GPT_CACHE_TTL = int(os.getenv("GPT_CACHE_TTL", str(24 * 60 * 60)))  # 초 단위
+GPT_CACHE_MAX_ENTRIES = int(os.getenv("GPT_CACHE_MAX_ENTRIES", "1000"))
 
-def preprocess_image(image):
-    """이미지 전처리 함수: 대비 조정 및 해상도 향상"""
-
-    # 이미지 모드 변환
-    if image.mode == 'RGBA':
-        image = image.convert('RGB')  # RGBA를 RGB로 변환
+if GPT_CACHE_BACKEND == "sqlite":
+    gpt_cache = SQLiteCache(os.getenv("GPT_CACHE_PATH", "gpt_cache.sqlite3"), GPT_CACHE_MAX_ENTRIES, GPT_CACHE_TTL)
+else:
+    gpt_cache = MemoryCache(GPT_CACHE_MAX_ENTRIES, GPT_CACHE_TTL)
+# 응답 내용에 영향을 주지 않아 캐시 키에서 빼는 요청 필드
+GPT_CACHE_IGNORED_FIELDS = ("stream", "user")
 
-    # 흑백 변환
-    image = image.convert("L")  # 그레이스케일로 변환
+def call_gpt_api(payload):
+    # 같은 요청(response_format, temperature 등 응답에 영향을 주는 모든 필드)은 캐시된 응답 반환
+    cache_key = make_cache_key({key: value for key, value in payload.items() if key not in GPT_CACHE_IGNORED_FIELDS})
+    cached = gpt_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-    # 대비 증가
-    enhancer = ImageEnhance.Contrast(image)
-    image = enhancer.enhance(2)  # 대비 증가 (값 조정 가능)
+    # GPT-4o mini API로 OCR 요청
+    response = http_client.post("openai", f"{http_client.OPENAI_API_BASE}/chat/completions", headers=headers, json=payload)
+    response.raise_for_status()  # 응답 상태 코드 확인
+    content = response.json()['choices'][0]['message']['content'].strip()
+    gpt_cache.set(cache_key, content)
+    return content
 
-    # 해상도 향상
-    resize_num = 2
-    image = image.resize((image.width * resize_num, image.height * resize_num))  # 해상도 향상
 
-    # # 3. 이진화 (Adaptive Thresholding)
-    # image_array = np.array(image)
-    # threshold_value = image_array.mean()  # 평균값을 임계값으로 사용
-    # binary_image = (image_array > threshold_value) * 255  # 이진화
-    # image = Image.fromarray(binary_image.astype(np.uint8))
+def preprocess_image(image):
+    """이미지 전처리 함수: 대비 조정 및 해상도 조정 (NumPy/OpenCV 파이프라인, preprocess.py)
 
-    # 선명도 향상
-    enhancer = ImageEnhance.Sharpness(image)
-    image = enhancer.enhance(2)  # 선명도 증가 (값 조정 가능)
+    (전처리된 이미지, 적용한 배율)을 반환한다.
+    """
+    image, scale = run_preprocess(image, PREPROCESS_PARAMS)
 
-    image.save(os.path.join("processed_image/output_image.png"))
-    return image
+    # 디버그용 전처리 결과 저장 (설정한 경우에만)
+    if SAVE_PREPROCESSED_IMAGE:
+        with debug_output_lock:
+            image.save(os.path.join("processed_image/output_image.png"))
+    return image, scale
 
 def perform_ocr(image):
     """GPT-4o mini API를 사용하여 OCR 수행"""
@@ -159,15 +231,65 @@ def extract_text_with_layout(ocr_result):
     return ''.join(extracted_text).strip()
 
 def perform_clova_ocr(image_file, api_url, secret_key):
-    """네이버 클로바 OCR을 사용하여 이미지에서 텍스트를 추출하는 함수"""
+    """네이버 클로바 OCR을 사용하여 이미지에서 텍스트를 추출하는 함수
+
+    (추출한 텍스트, 평균 신뢰도, 캐시 적중 여부)를 반환한다.
+    같은 전처리 이미지와 전처리 설정이면 캐시된 결과를 사용하여 API를 호출하지 않는다.
+    """
+    return perform_clova_ocr_batch([image_file], api_url, secret_key)[0]
+
+def perform_clova_ocr_batch(image_files, api_url, secret_key):
+    """여러 이미지를 CLOVA_BATCH_SIZE장씩 묶어 OCR 요청하고 이미지별 결과를 입력 순서대로 반환하는 함수
+
+    각 결과는 (추출한 텍스트, 평균 신뢰도, 캐시 적중 여부)이며, 캐시에 있는 이미지는 요청에서 제외한다.
+    """
+    results = [None] * len(image_files)
+    pending = []  # 캐시에 없는 이미지: (인덱스, 캐시 키, 이미지 바이트)
+
+    for index, image_file in enumerate(image_files):
+        try:
+            # PIL 이미지 객체를 바이트로 변환
+            img_byte_arr = io.BytesIO()
+            image_file.save(img_byte_arr, format='PNG')  # 또는 필요한 형식으로 변경
+            image_bytes = img_byte_arr.getvalue()
+        except Exception as e:
+            print(f"OCR 처리 중 오류 발생: {str(e)}")
+            results[index] = ("OCR 실패: 오류 발생", 0, False)
+            continue
+
+        # 전처리된 이미지 바이트 + 전처리 설정으로 캐시 조회
+        cache_key = make_cache_key(image_bytes, PREPROCESS_PARAMS)
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            results[index] = (cached['formatted_text'], cached['confidence'], True)
+        else:
+            pending.append((index, cache_key, image_bytes))
+
+    # 요청당 이미지 수와 전체 바이트 한도 안에서 묶음 구성
+    batch = []
+    batch_bytes = 0
+    for item in pending:
+        if batch and (len(batch) >= CLOVA_BATCH_SIZE or batch_bytes + len(item[2]) > CLOVA_MAX_REQUEST_BYTES):
+            request_clova_ocr(batch, results, api_url, secret_key)
+            batch = []
+            batch_bytes = 0
+        batch.append(item)
+        batch_bytes += len(item[2])
+    if batch:
+        request_clova_ocr(batch, results, api_url, secret_key)
+
+    return results
+
+def request_clova_ocr(batch, results, api_url, secret_key):
+    """이미지 묶음을 한 번의 클로바 OCR 요청으로 보내고 이미지 이름 기준으로 결과를 나누어 results에 채우는 함수"""
     try:
-        # 요청 JSON 구성
+        # 요청 JSON 구성 (이미지 이름으로 응답을 다시 페이지별로 나눔)
         request_json = {
             'images': [
                 {
                     'format': 'png',
-                    'name': 'demo'
-                }
+                    'name': f'page{index}'
+                } for index, _, _ in batch
             ],
             'requestId': str(uuid.uuid4()),
             'version': 'V2',
@@ -176,21 +298,16 @@ def perform_clova_ocr(image_file, api_url, secret_key):
 
         payload = {'message': json.dumps(request_json).encode('UTF-8')}
 
-        # PIL 이미지 객체를 바이트로 변환
-        img_byte_arr = io.BytesIO()
-        image_file.save(img_byte_arr, format='PNG')  # 또는 필요한 형식으로 변경
-        img_byte_arr.seek(0)  # 바이트 배열의 시작으로 이동
-
-        # 파일 객체를 사용하여 POST 요청
+        # 파일 객체를 사용하여 POST 요청 (images 순서와 같은 순서)
         files = [
-            ('file', img_byte_arr)  # 바이트로 변환된 파일 객체
+            ('file', image_bytes) for _, _, image_bytes in batch  # 바이트로 변환된 파일 객체
         ]
         headers = {
             'X-OCR-SECRET': secret_key
         }
 
         # POST 요청
-        response = requests.post(api_url, headers=headers, data=payload, files=files)
+        response = http_client.post("clova", api_url, headers=headers, data=payload, files=files)
 
         # 응답 처리
         if response.status_code == 200:
@@ -198,50 +315,138 @@ def perform_clova_ocr(image_file, api_url, secret_key):
 
             output_json_path = './ocr_result_json/ocr_result.json'
 
-            with open(output_json_path, 'w', encoding='utf-8') as json_file:
+            with debug_output_lock, open(output_json_path, 'w', encoding='utf-8') as json_file:
                 json.dump(ocr_result, json_file, ensure_ascii=False, indent=4)
 
             print(f"OCR 결과가 {output_json_path}에 저장되었습니다.")
 
-            # inferConfidence 값 합산 및 정확도 계산
-            total_confidence = 0
-            num_items = 0
-            for item in ocr_result.get("images", [])[0].get("fields", []):
-                confidence = item.get("inferConfidence", 0)
-                if confidence:
-                    total_confidence += confidence
-                    num_items += 1
-
-            if num_items > 0:
-                average_confidence = total_confidence / num_items
-            else:
-                average_confidence = 0  # 값이 없으면 0으로 설정
-
-            # OCR 결과를 기반으로 텍스트 추출
-            formatted_text = extract_text_with_layout(ocr_result)  # 개행 및 공백 조절
-            return formatted_text, average_confidence # 추출한 텍스트 반환
+            image_results = {image.get('name'): image for image in ocr_result.get('images', [])}
+            for index, cache_key, _ in batch:
+                image_result = image_results.get(f'page{index}')
+                if image_result is None:
+                    results[index] = ("OCR 실패: 응답에 결과 없음", 0, False)
+                    continue
+
+                # 페이지별 응답으로 나누어 신뢰도 계산 및 텍스트 추출
+                page_result = dict(ocr_result, images=[image_result])
+                average_confidence = calculate_ocr_confidence(image_result)
+                formatted_text = extract_text_with_layout(page_result)  # 개행 및 공백 조절
+
+                # 원본 응답, 레이아웃 텍스트, 신뢰도를 캐시에 저장
+                ocr_cache.set(cache_key, {
+                    "ocr_result": page_result,
+                    "formatted_text": formatted_text,
+                    "confidence": average_confidence,
+                })
+                results[index] = (formatted_text, average_confidence, False)
         else:
             print(f"API 요청 실패: {response.status_code}, {response.text}")
-            return "OCR 실패: API 요청 오류 발생"
+            for index, _, _ in batch:
+                results[index] = ("OCR 실패: API 요청 오류 발생", 0, False)
 
     except Exception as e:
         print(f"OCR 처리 중 오류 발생: {str(e)}")
-        return "OCR 실패: 오류 발생"
-    
+        for index, _, _ in batch:
+            results[index] = ("OCR 실패: 오류 발생", 0, False)
+
+def calculate_ocr_confidence(image_result):
+    """OCR 결과 이미지 한 장의 inferConfidence 평균을 계산하는 함수"""
+    total_confidence = 0
+    num_items = 0
+    for item in image_result.get("fields", []):
+        confidence = item.get("inferConfidence", 0)
+        if confidence:
+            total_confidence += confidence
+            num_items += 1
+
+    if num_items > 0:
+        return total_confidence / num_items
+    return 0  # 값이 없으면 0으로 설정
+
+def ocr_page(image):
+    """페이지 한 장을 GridFS에 저장한 뒤 전처리 및 OCR을 수행하는 함수"""
+    return ocr_page_batch([image])[0]
+
+def ocr_page_batch(images):
+    """여러 페이지를 GridFS에 저장하고 전처리한 뒤 묶음 OCR을 수행하여 페이지별 결과 리스트를 반환하는 함수"""
+    image_ids = []
+    scales = []
+    processed_images = []
+    for image in images:
+        # GridFS에 이미지 저장 (전처리 전에)
+        image_ids.append(save_image_to_gridfs(image))
+        # 이미지 전처리
+        processed_image, scale = preprocess_image(image)
+        processed_images.append(processed_image)
+        scales.append(scale)
+
+    # 전처리된 이미지들로 OCR 수행
+    ocr_results = perform_clova_ocr_batch(processed_images, api_url, secret_key)
+    return [
+        {
+            "image_id": image_id,
+            "scale": scale,
+            "text": formatted_text,
+            "confidence": confidence,
+            "cache_hit": cache_hit,
+        }
+        for image_id, scale, (formatted_text, confidence, cache_hit) in zip(image_ids, scales, ocr_results)
+    ]
+
+def ocr_pages_concurrently(pages, max_in_flight=OCR_MAX_IN_FLIGHT):
+    """(페이지 번호, 이미지) 목록을 워커 풀로 동시에 OCR 처리하고 페이지 순서대로 결과를 반환하는 제너레이터
+
+    페이지는 CLOVA_BATCH_SIZE장씩 묶어 한 번의 OCR 요청으로 처리하며, 동시에 처리 중인
+    페이지는 최대 max_in_flight개(최소 한 묶음)로 제한된다.
+    결과는 (페이지 번호, ocr_page 결과) 형태로 입력 순서를 유지한다.
+    """
+    batches_in_flight = max(1, max_in_flight // CLOVA_BATCH_SIZE)
+
+    def submit(executor, batch):
+        page_numbers = [page_number for page_number, _ in batch]
+        return page_numbers, executor.submit(ocr_page_batch, [image for _, image in batch])
+
+    with ThreadPoolExecutor(max_workers=batches_in_flight) as executor:
+        in_flight = deque()
+        batch = []
+        for page_number, image in pages:
+            batch.append((page_number, image))
+            if len(batch) < CLOVA_BATCH_SIZE:
+                continue
+            in_flight.append(submit(executor, batch))
+            batch = []
+            # 처리 중인 묶음 수가 한도에 도달하면 가장 앞 묶음의 결과를 기다림
+            if len(in_flight) >= batches_in_flight:
+                page_numbers, future = in_flight.popleft()
+                yield from zip(page_numbers, future.result())
+
+        if batch:
+            in_flight.append(submit(executor, batch))
+
+        while in_flight:
+            page_numbers, future = in_flight.popleft()
+            yield from zip(page_numbers, future.result())
 
 def summarize_text(text):
-    """GPT-4o mini API를 사용하여 텍스트 요약"""
+    """GPT-4o mini API를 사용하여 텍스트 요약 (긴 문서는 나누어 요약한 뒤 합침)"""
     if len(text.split()) < 30:
         return "텍스트가 너무 짧아 요약할 수 없습니다."
 
     try:
+        if len(text) > SUMMARY_CHUNK_CHARS:
+            # 긴 문서: 부분 요약(map) 후 최종 요약(reduce)
+            text = reduce_text_for_summary(text)
+            prompt = f"다음은 긴 문서를 부분별로 요약한 내용이야. 전체 문서의 중요 내용들만 3~4줄 분량의 개조식으로 요약해줘:\n{text}"
+        else:
+            prompt = f"다음 텍스트의 중요 내용들만 3~4줄 분량의 개조식으로 요약해줘:\n{text}"
+
         # 텍스트 요약 요청 페이로드
         summary_payload = {
             "model": "gpt-4o-mini",
             "messages": [
                 {
                     "role": "user",
-                    "content": f"다음 텍스트의 중요 내용들만 3~4줄 분량의 개조식으로 요약해줘:\n{text}"
+                    "content": prompt
                 }
             ],
             "max_tokens": 250
@@ -254,7 +459,79 @@ def summarize_text(text):
     except Exception as e:
         print(f"요약 처리 중 오류 발생: {str(e)}")
         return "요약 실패: 오류 발생"
-    
+
+def split_text_for_summary(text, max_chars=SUMMARY_CHUNK_CHARS):
+    """OCR 텍스트를 '=== 페이지 N ===' 구분자 기준으로 나누고 max_chars 이하의 청크로 묶는 함수"""
+    # 페이지 구분자 앞에서 분리 (구분자는 각 페이지 텍스트에 포함)
+    sections = [section for section in PAGE_MARKER_PATTERN.split(text) if section.strip()]
+
+    chunks = []
+    current = ""
+    for section in sections:
+        # 한 페이지가 한도를 넘으면 줄 단위로 다시 나눔
+        pieces = [section] if len(section) <= max_chars else split_long_section(section, max_chars)
+        for piece in pieces:
+            if current and len(current) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def split_long_section(section, max_chars):
+    """한도를 넘는 텍스트를 줄 단위(그래도 길면 글자 단위)로 max_chars 이하 조각으로 나누는 함수"""
+    pieces = []
+    current = ""
+    for line in section.splitlines(keepends=True):
+        if current and len(current) + len(line) > max_chars:
+            pieces.append(current)
+            current = ""
+        while len(line) > max_chars:
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+def summarize_chunk(chunk):
+    """긴 문서의 일부를 요약하는 함수 (map 단계)"""
+    chunk_payload = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {
+                "role": "user",
+                "content": (
+                    f"다음은 긴 문서의 일부야. 이 부분의 중요 내용들을 개조식으로 요약해줘 "
+                    f"(페이지 번호, 문서 형식, 기업명, 이름, 전화번호, 날짜, 금액 같은 핵심 데이터는 그대로 유지):\n{chunk}"
+                )
+            }
+        ],
+        "max_tokens": 250
+    }
+    return call_gpt_api(chunk_payload)
+
+def reduce_text_for_summary(text):
+    """텍스트를 청크로 나누어 동시에 요약하고, 합친 결과가 한도 이하가 될 때까지 반복하는 함수
+
+    SUMMARY_MAX_ROUNDS번 반복하거나 한 번의 반복으로 길이가 줄지 않으면 멈추고, 남은 텍스트는 한도에 맞게 자른다.
+    """
+    for _ in range(SUMMARY_MAX_ROUNDS):
+        if len(text) <= SUMMARY_CHUNK_CHARS:
+            return text
+        chunks = split_text_for_summary(text)
+        partial_summaries = list(summary_executor.map(summarize_chunk, chunks))  # 청크 순서 유지
+        reduced = "\n\n".join(partial_summaries)
+        if len(reduced) >= len(text):
+            break  # 요약해도 줄어들지 않으면 API 호출만 반복되므로 중단
+        text = reduced
+
+    if len(text) > SUMMARY_CHUNK_CHARS:
+        print(f"요약 결과가 한도를 넘어 {SUMMARY_CHUNK_CHARS}자로 자름 (원래 {len(text)}자)")
+        text = text[:SUMMARY_CHUNK_CHARS]
+    return text
+
 def format_data(text):
     """GPT-4o mini API를 사용하여 텍스트를 정형화"""
     try:
@@ -278,18 +555,98 @@ def format_data(text):
         print(f"데이터 정형화 처리 중 오류 발생: {str(e)}")
         return "정형화 실패: 오류 발생"
 
-def convert_pdf_to_images(file):
-    """PDF 파일을 이미지로 변환하는 함수"""
-    pdf_document = fitz.open(stream=file.read(), filetype="pdf")  # PDF 문서 열기
-    images = []
+def summarize_and_format_text(text):
+    """GPT-4o mini API 한 번의 요청으로 텍스트 요약과 정형화를 함께 수행 (요약, 정형화 문자열 반환)"""
+    if len(text.split()) < 30:
+        return "텍스트가 너무 짧아 요약할 수 없습니다.", format_data(text)
+
+    try:
+        if len(text) > SUMMARY_CHUNK_CHARS:
+            # 긴 문서: 나누어 요약(map)한 결과로 요약/정형화 (부분 요약은 핵심 데이터를 유지하도록 요청)
+            text = "다음은 긴 문서를 부분별로 요약한 내용이야.\n" + reduce_text_for_summary(text)
+
+        # 요약 + 정형화 요청 페이로드 (JSON 형식 응답)
+        fused_payload = {
+            "model": "gpt-4o-mini",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": (
+                        f"다음 텍스트를 처리해서 JSON으로만 답해줘.\n"
+                        f"\"summary\": 텍스트의 중요 내용들만 3~4줄 분량의 개조식으로 요약한 문자열\n"
+                        f"\"formatted_data\": 문서의 중요한 데이터들(예를 들어, 문서 형식, 기업명, 관리자, 대표자, 전화번호, 날짜, 금액 그 외 등등 문서 내용에 맞게 고쳐써야 함.)을 "
+                        f"문서 내용에 맞게 추출해서 한 줄에 하나씩 '키 : 값' 형식으로 정형화한 문자열\n\n{text}"
+                    )
+                }
+            ],
+            "response_format": {"type": "json_object"},
+            "max_tokens": 650
+        }
+
+        result = json.loads(call_gpt_api(fused_payload))
+        summary = result.get("summary", "")
+        formatted_data = result.get("formatted_data", "")
+        if isinstance(formatted_data, dict):
+            # 모델이 객체로 돌려준 경우 '키 : 값' 문자열로 변환
+            formatted_data = "\n".join(f"{key} : {value}" for key, value in formatted_data.items())
+        return summary, formatted_data
 
-    for page_number in range(len(pdf_document)):
-        page = pdf_document.load_page(page_number)  # 페이지 로드
+    except Exception as e:
+        print(f"요약/정형화 처리 중 오류 발생: {str(e)}")
+        return "요약 실패: 오류 발생", "정형화 실패: 오류 발생"
+
+class UploadTooLargeError(ValueError):
+    """업로드 파일이 MAX_UPLOAD_BYTES를 넘을 때 발생하는 예외"""
+
+def spool_upload(file, path=None):
+    """업로드 파일을 청크 단위로 디스크에 저장하고 경로를 반환하는 함수 (메모리에 전체를 올리지 않음)
+
+    path가 없으면 UPLOAD_SPOOL_DIR에 임시 파일을 만들며, 크기가 MAX_UPLOAD_BYTES를 넘으면
+    저장한 파일을 지우고 UploadTooLargeError를 발생시킨다.
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="upload_", dir=UPLOAD_SPOOL_DIR)
+        output = os.fdopen(fd, 'wb')
+    else:
+        output = open(path, 'wb')
+
+    size = 0
+    try:
+        with output:
+            while True:
+                chunk = file.stream.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadTooLargeError(f"파일 크기가 최대 {MAX_UPLOAD_BYTES // (1024 * 1024)}MB를 넘습니다.")
+                output.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+def open_pdf(path):
+    """디스크에 저장된 PDF 파일을 여는 함수 (PyMuPDF가 파일에서 필요한 부분만 읽음)"""
+    return fitz.open(path, filetype="pdf")  # PDF 문서 열기
+
+def select_pdf_pages(pdf_document, pages=None):
+    """처리할 페이지 번호 리스트 반환 (범위를 벗어난 페이지 제외, 지정이 없으면 모든 페이지)"""
+    if pages is None:
+        return list(range(len(pdf_document)))
+    return [page_number for page_number in pages if 0 <= page_number < len(pdf_document)]  # 페이지 번호 유효성 검사
+
+def convert_pdf_to_images(pdf_document, pages=None):
+    """PDF 문서를 페이지 단위로 이미지로 변환하는 제너레이터
+
+    pages(0부터 시작하는 페이지 번호 리스트)가 주어지면 해당 페이지만 렌더링하며,
+    (페이지 번호, PIL 이미지)를 한 장씩 반환하므로 문서 전체를 메모리에 올리지 않는다.
+    """
+    for page_number in select_pdf_pages(pdf_document, pages):
+        page = pdf_document.load_page(page_number)  # 요청된 페이지만 로드
         pix = page.get_pixmap()  # 페이지를 이미지로 변환
         image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)  # PIL 이미지로 변환
-        images.append(image)
-
-    return images  # 변환된 이미지 리스트 반환
+        yield page_number, image
 
 def parse_page_range(range_str):
     """페이지 범위를 문자열로 받아 리스트로 변환하는 함수"""
@@ -304,17 +661,61 @@ def parse_page_range(range_str):
     return pages
 
 def save_image_to_gridfs(image):
-    """이미지를 GridFS에 저장하고 ID를 반환하는 함수"""
-    buffered = io.BytesIO()
+    """이미지를 GridFS에 저장하고 ID를 반환하는 함수
 
+    픽셀 내용의 해시가 같은 이미지가 이미 저장되어 있으면 새로 저장하지 않고 기존 ID를 반환한다.
+    """
     # 이미지 모드가 RGBA일 경우 RGB로 변환
     if image.mode == 'RGBA':
         image = image.convert('RGB')  # RGBA를 RGB로 변환
 
+    # 내용 해시로 중복 확인 (JPEG 인코딩 전에 확인하여 중복 이미지는 인코딩도 생략)
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode('utf-8'))
+    digest.update(image.tobytes())
+    content_hash = digest.hexdigest()
+
+    existing = fs.find_one({"content_hash": content_hash})
+    if existing is not None:
+        return existing._id
+
+    # 검색 결과 미리보기용 썸네일을 먼저 저장하고 원본에 연결
+    thumbnail_id = save_thumbnail_to_gridfs(image)
+
+    buffered = io.BytesIO()
     image.save(buffered, format="JPEG")  # 이미지를 JPEG 포맷으로 저장
-    image_id = fs.put(buffered.getvalue(), filename="uploaded_image.jpg")  # GridFS에 저장
+    image_id = fs.put(
+        buffered.getvalue(),
+        filename="uploaded_image.jpg",
+        content_type="image/jpeg",
+        content_hash=content_hash,
+        thumbnail_id=thumbnail_id,
+    )  # GridFS에 저장
     return image_id
 
+def save_thumbnail_to_gridfs(image):
+    """이미지의 썸네일(긴 변 THUMBNAIL_SIZE px)을 GridFS에 저장하고 ID를 반환하는 함수"""
+    thumbnail = image.copy()
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    if thumbnail.mode not in ('RGB', 'L'):
+        thumbnail = thumbnail.convert('RGB')
+
+    buffered = io.BytesIO()
+    thumbnail.save(buffered, format="JPEG", quality=80)
+    return fs.put(buffered.getvalue(), filename="thumbnail.jpg", content_type="image/jpeg")
+
+def get_thumbnail_id(image_id):
+    """원본 이미지의 썸네일 ID를 반환하는 함수 (썸네일이 없는 기존 이미지는 이때 만들어 저장)"""
+    file_doc = db['fs.files'].find_one({"_id": image_id}, {"thumbnail_id": 1})
+    if file_doc is None:
+        return None
+    if file_doc.get("thumbnail_id"):
+        return file_doc["thumbnail_id"]
+
+    image = Image.open(fs.get(image_id))
+    thumbnail_id = save_thumbnail_to_gridfs(image)
+    db['fs.files'].update_one({"_id": image_id}, {"$set": {"thumbnail_id": thumbnail_id}})
+    return thumbnail_id
+
 def parse_formatted_data(formatted_data_str):
     """정형화된 데이터 문자열을 사전으로 변환하는 함수"""
     formatted_data = {}
@@ -327,8 +728,84 @@ def parse_formatted_data(formatted_data_str):
             
     return formatted_data
 
-def save_db_upload(filename, ocr_text, image_id, confidence):
-    """업로드 정보를 upload 컬렉션에 저장하는 함수"""
+def ensure_indexes():
+    """앱 시작 시 필요한 MongoDB 인덱스 생성"""
+    db['fs.files'].create_index("content_hash")  # GridFS 이미지 중복 확인용
+    if SEARCH_BACKEND == "mongo":
+        # 검색용 n-gram 인덱스 (날짜 조건도 같은 인덱스에서 처리)
+        data_collection.create_index([("search_ngrams", 1), ("upload_date", -1)])
+    data_collection.create_index([("upload_date", -1), ("_id", -1)])
+    data_collection.create_index("doc_type")  # RAG 문서 종류 필터 (distinct 조회)
+
+def to_epoch(upload_date):
+    """upload_date(UTC로 저장된 naive datetime)를 epoch 초로 변환"""
+    if upload_date.tzinfo is None:
+        upload_date = upload_date.replace(tzinfo=timezone.utc)
+    return upload_date.timestamp()
+
+def date_range_to_epoch(start_date=None, end_date=None):
+    """'YYYY-MM-DD' 날짜 범위를 (시작, 끝) epoch 초로 변환 (end_date는 그날 하루 전체 포함, 없으면 None)"""
+    start_ts = end_ts = None
+    if start_date:
+        start_ts = datetime.fromisoformat(start_date).replace(tzinfo=timezone.utc).timestamp()
+    if end_date:
+        end_date_dt = datetime.fromisoformat(end_date).replace(tzinfo=timezone.utc)
+        end_ts = (end_date_dt.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).timestamp()
+    return start_ts, end_ts
+
+def normalize_search_text(text):
+    """검색용 텍스트 정규화: 소문자 변환, 연속된 공백/개행/탭을 공백 하나로"""
+    return WHITESPACE_PATTERN.sub(' ', str(text)).strip().lower()
+
+def text_ngrams(text):
+    """정규화된 텍스트의 글자 단위 1-gram, 2-gram 집합 (공백이 포함된 조각 제외)
+
+    한국어는 띄어쓰기 단위로 나누면 조사가 붙어 검색되지 않으므로 글자 단위 n-gram을 사용한다.
+    """
+    grams = {char for char in text if char != ' '}
+    grams.update(text[i:i + 2] for i in range(len(text) - 1) if ' ' not in text[i:i + 2])
+    return grams
+
+def query_ngrams(keyword):
+    """검색어 하나를 찾기 위해 문서에 모두 있어야 하는 n-gram 목록"""
+    if len(keyword) == 1:
+        return [keyword]
+    return sorted({keyword[i:i + 2] for i in range(len(keyword) - 1) if ' ' not in keyword[i:i + 2]})
+
+# formatted_data에서 문서 종류로 사용할 키 (공백 제거 후 비교)
+DOCUMENT_TYPE_KEYS = ("문서형식", "문서종류", "문서유형")
+
+def document_type(formatted_data):
+    """formatted_data의 '문서 형식' 값 (없으면 빈 문자열)"""
+    if isinstance(formatted_data, dict):
+        for key, value in formatted_data.items():
+            if WHITESPACE_PATTERN.sub('', str(key)) in DOCUMENT_TYPE_KEYS and value:
+                return str(value).strip()
+    return ""
+
+def build_search_fields(filename, ocr_text, summary, formatted_data):
+    """data 문서의 검색/필터용 필드 (search_text, doc_type, mongo 방식이면 search_ngrams) 생성
+
+    search_text는 /search에서 실제 포함 여부를 확인하는 데 쓰이므로 항상 만든다.
+    """
+    values = [filename, ocr_text, summary]
+    if isinstance(formatted_data, dict):
+        values.extend(formatted_data.values())
+    search_text = normalize_search_text('\n'.join(str(value) for value in values if value))
+    fields = {"search_text": search_text, "doc_type": document_type(formatted_data)}
+    if SEARCH_BACKEND == "mongo":
+        fields["search_ngrams"] = sorted(text_ngrams(search_text))
+    return fields
+
+def backfill_search_fields():
+    """검색용 필드가 없는 기존 data 문서에 필드 추가 (앱 시작 시 한 번)"""
+    search_field = "search_ngrams" if SEARCH_BACKEND == "mongo" else "search_text"
+    for doc in data_collection.find({"$or": [{search_field: {"$exists": False}}, {"doc_type": {"$exists": False}}]}):
+        fields = build_search_fields(doc.get("filename"), doc.get("ocr_text"), doc.get("summary"), doc.get("formatted_data"))
+        data_collection.update_one({"_id": doc["_id"]}, {"$set": fields})
+
+def save_db_upload(filename, ocr_text, image_id, confidence, preprocess=None, pages=None):
+    """업로드 정보를 upload 컬렉션에 저장하는 함수 (pages: 페이지별 이미지 ID 목록)"""
     try:
         upload_result = db['upload'].insert_one({
             "filename": filename,
@@ -336,28 +813,105 @@ def save_db_upload(filename, ocr_text, image_id, confidence):
             "upload_date": datetime.now(),
             "image_id": image_id,
             "confidence": confidence,
+            "preprocess": preprocess,
+            "pages": pages,
         })
         return str(upload_result.inserted_id)  # 데이터 ID 반환
     except Exception as e:
         print(f"Error in save_db_upload: {str(e)}")
         return None
 
-def save_db_data(upload_id, filename, ocr_text, summary, formatted_data, upload_date, image_id):
+def extract_document(path, filename, content_type, pages_to_process=None, on_page=None):
+    """디스크에 저장된 업로드 문서 한 건의 변환/전처리/OCR/저장을 수행하고 결과를 반환하는 함수
+
+    on_page가 주어지면 페이지 하나가 끝날 때마다 (페이지 번호, 완료 페이지 수, 전체 페이지 수)로 호출된다.
+    """
+    ocr_text = ""
+    image_id = None  # 대표 이미지 (첫 페이지)
+    pages = []  # 페이지 목록: {"page": 페이지 번호, "image_id": GridFS ID}
+    confidences = []
+    cache_hits = []  # OCR 캐시에서 결과를 가져온 페이지 번호
+    scales = []  # 페이지별 전처리 배율
+
+    if content_type == 'application/pdf':
+        pdf_document = open_pdf(path)
+        try:
+            # 요청된 페이지만 한 장씩 이미지로 변환 (페이지 범위가 없으면 모든 페이지)
+            page_numbers = select_pdf_pages(pdf_document, pages_to_process)
+            page_images = convert_pdf_to_images(pdf_document, page_numbers)
+
+            # 페이지들을 동시에 OCR 처리하고 페이지 순서대로 결과를 합침
+            for pages_done, (page_number, result) in enumerate(ocr_pages_concurrently(page_images), start=1):
+                pages.append({"page": page_number + 1, "image_id": result['image_id']})
+                ocr_text += f"=== 페이지 {page_number + 1} ===\n\n{result['text']}\n\n\n"
+                confidences.append(result['confidence'])  # Confidence 값 저장
+                scales.append(result['scale'])
+                if result['cache_hit']:
+                    cache_hits.append(page_number + 1)
+                if on_page:
+                    on_page(page_number + 1, pages_done, len(page_numbers))
+        finally:
+            pdf_document.close()
+    else:
+        # JPG, PNG 등 이미지 파일 처리
+        img = Image.open(path)
+        result = ocr_page(img)
+        pages.append({"page": 1, "image_id": result['image_id']})
+        ocr_text = result['text']
+        confidences.append(result['confidence'])  # Confidence 값 저장
+        scales.append(result['scale'])
+        if result['cache_hit']:
+            cache_hits.append(1)
+        if on_page:
+            on_page(1, 1, 1)
+
+    print(f"최종 신뢰도 리스트 : {confidences}")
+    # 전체 평균 정확도 계산
+    overall_confidence = sum(confidences) / len(confidences) if confidences else 0
+    print(f"평균 신뢰도 : + {overall_confidence}")
+
+    # 업로드 정보를 DB에 저장
+    # 전처리 설정도 함께 저장하여 설정별 정확도(/accuracy)를 비교할 수 있게 함
+    preprocess = {"params": PREPROCESS_PARAMS, "scales": scales}
+    if pages:
+        image_id = pages[0]['image_id']
+    upload_id = save_db_upload(filename, ocr_text, image_id, overall_confidence, preprocess, pages)
+
+    return {"html": ocr_text, "upload_id": upload_id, "confidence": overall_confidence, "cache_hits": cache_hits}
+
+# data 문서가 저장될 때 호출할 함수 목록 (검색 인덱스 등 갱신용, 저장된 문서를 인자로 받음)
+data_saved_hooks = []
+
+def on_data_saved(hook):
+    """data 문서 저장 후 호출할 함수 등록"""
+    data_saved_hooks.append(hook)
+    return hook
+
+def save_db_data(upload_id, filename, ocr_text, summary, formatted_data, upload_date, image_id, pages=None):
     """처리된 데이터를 data 컬렉션에 저장하는 함수"""
     try:
-        data_result = data_collection.insert_one({
+        data_doc = {
             "upload_id": upload_id,  # 업로드 ID 연결
             "filename": filename,
             "ocr_text": ocr_text,
             "summary": summary,
             "formatted_data": formatted_data,
             "upload_date": upload_date,
-            "image_id": image_id
-        })
-        return str(data_result.inserted_id)  # 데이터 ID 반환
+            "image_id": image_id,
+            "pages": pages,
+            **build_search_fields(filename, ocr_text, summary, formatted_data),
+        }
+        data_result = data_collection.insert_one(data_doc)  # insert_one이 data_doc에 _id를 채움
     except Exception as e:
         print(f"Error in save_db_data: {str(e)}")
         return None
+
+    for hook in data_saved_hooks:
+        try:
+            hook(data_doc)
+        except Exception as e:
+            print(f"Error in data saved hook {hook.__name__}: {str(e)}")
+    return str(data_result.inserted_id)  # 데이터 ID 반환
     
 def get_ocr_text_from_upload(upload_id):
     # MongoDB 쿼리 예시
@@ -31,53 +31,61 @@ function RagPage() {
   };
 
   useEffect(() => {
-    const fetchSearchResults = async () => {
-      setIsLoading(true);
-      setErrorMessage("");
-
-      const cachedData = getCachedData();
-      if (cachedData) {
-        setSearchResults(cachedData.results);
-        setMostSimilarDocument(cachedData.sources[0]);
-        setIsLoading(false);
-        return;
-      }
-
-      try {
-        const response = await fetch(
-          `http://127.0.0.1:5000/rag?query=${encodeURIComponent(query)}`
-        );
+    if (!query) {
+      return undefined;
+    }
 
-        if (!response.ok) {
-          throw new Error("Network response was not ok");
-        }
-
-        const data = await response.json();
-
-        if (data.results && data.sources && data.sources.length > 0) {
-          setSearchResults(data.results);
-          setMostSimilarDocument(data.sources[0]);
-
-          // 데이터를 로컬 스토리지에 저장하여 캐시
-          localStorage.setItem(query, JSON.stringify(data));
-        } else {
-          console.warn("Expected 'results' and 'sources' to be present", data);
-          setSearchResults(null);
-          setMostSimilarDocument(null);
-        }
-      } catch (error) {
-        console.error("Error fetching search results:", error);
-        setErrorMessage("검색 결과를 가져오는 데 오류가 발생했습니다.");
-        setSearchResults(null);
-        setMostSimilarDocument(null);
-      } finally {
-        setIsLoading(false);
-      }
-    };
+    setErrorMessage("");
 
-    if (query) {
-      fetchSearchResults();
+    const cachedData = getCachedData();
+    if (cachedData) {
+      setSearchResults(cachedData.results);
+      setMostSimilarDocument(cachedData.sources[0]);
+      setIsLoading(false);
+      return undefined;
     }
+
+    setIsLoading(true);
+    setSearchResults(null);
+    setMostSimilarDocument(null);
+
+    // 답변 토큰을 SSE로 받아 도착하는 대로 화면에 표시
+    const eventSource = new EventSource(
+      `http://127.0.0.1:5000/rag/stream?query=${encodeURIComponent(query)}`
+    );
+    let answer = "";
+
+    eventSource.addEventListener("token", (event) => {
+      answer += JSON.parse(event.data);
+      setSearchResults(answer);
+      setIsLoading(false);
+    });
+
+    eventSource.addEventListener("sources", (event) => {
+      const data = JSON.parse(event.data);
+      eventSource.close();
+      if (data.sources && data.sources.length > 0) {
+        setMostSimilarDocument(data.sources[0]);
+
+        // 데이터를 로컬 스토리지에 저장하여 캐시
+        localStorage.setItem(
+          query,
+          JSON.stringify({ results: answer, sources: data.sources })
+        );
+      }
+      setIsLoading(false);
+    });
+
+    // 서버가 보낸 error 이벤트와 연결 오류 모두 처리
+    eventSource.addEventListener("error", (event) => {
+      console.error("Error streaming search results:", event.data || event);
+      eventSource.close();
+      setErrorMessage("검색 결과를 가져오는 데 오류가 발생했습니다.");
+      setIsLoading(false);
+    });
+
+    return () => eventSource.close();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [query]);
 
   if (isLoading) return <div className="loading">검색 중...</div>;
@@ -7,21 +7,47 @@ function SearchResults() {
   const [searchResults, setSearchResults] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [errorMessage, setErrorMessage] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const queryParams = new URLSearchParams(location.search);
   const query = queryParams.get("query");
   const startDate = queryParams.get("start_date");
   const endDate = queryParams.get("end_date");
 
+  const buildSearchUrl = (cursor) =>
+    `http://127.0.0.1:5000/search?query=${encodeURIComponent(query)}${
+      startDate ? `&start_date=${encodeURIComponent(startDate)}` : ""
+    }${endDate ? `&end_date=${encodeURIComponent(endDate)}` : ""}${
+      cursor ? `&cursor=${encodeURIComponent(cursor)}` : ""
+    }`;
+
+  const loadMoreResults = async () => {
+    setIsLoadingMore(true);
+    try {
+      const response = await fetch(buildSearchUrl(nextCursor));
+
+      if (!response.ok) {
+        throw new Error("Network response was not ok");
+      }
+
+      const data = await response.json();
+      setSearchResults((prev) => prev.concat(data.results || []));
+      setNextCursor(data.next_cursor || null);
+    } catch (error) {
+      console.error("Error fetching more search results:", error);
+      setErrorMessage("검색 결과를 더 가져오는 데 오류가 발생했습니다.");
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     const fetchSearchResults = async () => {
       setIsLoading(true);
       setErrorMessage("");
+      setNextCursor(null);
       try {
-        const response = await fetch(
-          `http://127.0.0.1:5000/search?query=${encodeURIComponent(query)}${
-            startDate ? `&start_date=${encodeURIComponent(startDate)}` : ""
-          }${endDate ? `&end_date=${encodeURIComponent(endDate)}` : ""}`
-        );
+        const response = await fetch(buildSearchUrl(null));
 
         if (!response.ok) {
           throw new Error("Network response was not ok");
@@ -31,6 +57,7 @@ function SearchResults() {
 
         if (Array.isArray(data.results)) {
           setSearchResults(data.results);
+          setNextCursor(data.next_cursor || null);
         } else {
           console.warn("Expected 'results' to be an array", data.results);
           setSearchResults([]);
@@ -47,6 +74,7 @@ function SearchResults() {
     if (query) {
       fetchSearchResults();
     }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [query, startDate, endDate]);
 
   if (isLoading) return <div className="loading">검색 중...</div>;
@@ -65,11 +93,14 @@ function SearchResults() {
                 <p>{result.summary}</p>
               </div>
               <div className="image-content">
-                <img
-                  src={result.image_url}
-                  alt="미리보기"
-                  className="result-image"
-                />
+                <a href={result.image_url} target="_blank" rel="noreferrer">
+                  <img
+                    src={result.thumbnail_url || result.image_url}
+                    alt="미리보기"
+                    className="result-image"
+                    loading="lazy"
+                  />
+                </a>
               </div>
             </fieldset>
           ))
@@ -77,6 +108,11 @@ function SearchResults() {
           <div>검색 결과가 없습니다.</div>
         )}
       </div>
+      {nextCursor && (
+        <button onClick={loadMoreResults} disabled={isLoadingMore}>
+          {isLoadingMore ? "불러오는 중..." : "더 보기"}
+        </button>
+      )}
     </div>
   );
 }
@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+# PIL ImageFilter.SMOOTH 커널 (ImageEnhance.Sharpness의 기준 이미지)
+SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+
+
+def contrast_lut(gray, factor):
+    """PIL ImageEnhance.Contrast와 같은 변환(평균 밝기 기준 대비 조정)을 256칸 조회 테이블로 계산"""
+    mean = int(cv2.mean(gray)[0] + 0.5)
+    lut = mean + factor * (np.arange(256, dtype=np.float32) - mean)
+    return np.clip(np.rint(lut), 0, 255).astype(np.uint8)
+
+
+def sharpen_kernel(factor):
+    """PIL ImageEnhance.Sharpness(원본과 SMOOTH 이미지의 블렌딩)를 하나의 3x3 커널로 합친 필터"""
+    identity = np.zeros((3, 3), dtype=np.float32)
+    identity[1, 1] = 1
+    return identity * factor + SMOOTH_KERNEL * (1 - factor)
+
+
+def to_gray_array(image):
+    """PIL 이미지를 그레이스케일 uint8 배열로 변환 (RGB/RGBA는 OpenCV로 바로 변환)"""
+    if image.mode == 'L':
+        return np.array(image)
+    if image.mode == 'RGB':
+        return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2GRAY)
+    if image.mode == 'RGBA':
+        return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGBA2GRAY)  # 알파 채널은 무시
+    return np.array(image.convert("L"))
+
+
+def estimate_text_height(gray, max_side=2000):
+    """페이지에서 글자 조각(연결 요소) 높이(px)의 중앙값을 추정, 글자를 찾지 못하면 None
+
+    한글은 자모가 떨어져 있어 한 글자가 여러 조각으로 잡히므로 실제 글자 높이보다 작게 나온다.
+    큰 페이지는 축소한 사본에서 연결 요소를 찾은 뒤 원래 크기로 환산한다.
+    """
+    ratio = min(1.0, max_side / max(gray.shape))
+    sample = cv2.resize(gray, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA) if ratio < 1 else gray
+
+    # 글자를 흰색으로 이진화 (Otsu)
+    _, binary = cv2.threshold(sample, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # 잡음(너무 작은 점)과 표 테두리/그림(너무 큰 덩어리) 제외
+    is_glyph = (heights >= 3) & (heights <= sample.shape[0] / 20) & (widths <= heights * 4)
+    if is_glyph.sum() < 20:
+        return None
+    return float(np.median(heights[is_glyph])) / ratio
+
+
+def choose_scale(gray, params):
+    """전처리 확대 배율 결정
+
+    params['resize']가 숫자면 그대로 사용하고, 'auto'면 글자 높이로 추정한 DPI가
+    params['target_dpi']가 되도록 배율을 고른다(축소 포함). 어느 경우든 OCR API의
+    최대 변 길이/픽셀 수 제한을 넘지 않도록 줄인다.
+    """
+    height, width = gray.shape
+    scale = params['resize']
+    if scale == 'auto':
+        text_height = estimate_text_height(gray)
+        if text_height is None:
+            scale = params['default_scale']  # 글자를 찾지 못하면 기본 배율
+        else:
+            estimated_dpi = text_height / (params['text_height_pt'] / 72)  # 본문 글자 조각 높이를 text_height_pt로 가정
+            scale = params['target_dpi'] / estimated_dpi
+            scale = min(max(scale, params['min_scale']), params['max_scale'])
+
+    # OCR API 이미지 크기 제한
+    scale = min(scale, params['max_side'] / max(height, width))
+    scale = min(scale, (params['max_pixels'] / (height * width)) ** 0.5)
+    return round(scale, 3)
+
+
+def preprocess_array(gray, params):
+    """그레이스케일 배열에 대비 조정 → 확대/축소 → (이진화) → 선명도 향상을 적용하고 (배열, 배율) 반환
+
+    대비 조정/이진화/선명도 향상은 모두 하나의 버퍼에서 제자리 연산으로 처리하고,
+    새 버퍼는 확대/축소 단계에서만 한 번 할당한다.
+    """
+    # 대비 증가 (조회 테이블로 제자리 변환)
+    np.take(contrast_lut(gray, params['contrast']), gray, out=gray)
+
+    # 해상도 조정
+    scale = choose_scale(gray, params)
+    if scale != 1:
+        interpolation = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+
+    # 이진화 (평균값을 임계값으로 사용)
+    if params.get('binarize'):
+        cv2.threshold(gray, cv2.mean(gray)[0], 255, cv2.THRESH_BINARY, dst=gray)
+
+    # 선명도 향상
+    cv2.filter2D(gray, -1, sharpen_kernel(params['sharpness']), dst=gray, borderType=cv2.BORDER_REPLICATE)
+    return gray, scale
+
+
+def preprocess_image(image, params):
+    """PIL 이미지를 전처리하여 (그레이스케일 PIL 이미지, 적용한 배율)로 반환"""
+    gray, scale = preprocess_array(to_gray_array(image), params)
+    return Image.fromarray(gray), scale
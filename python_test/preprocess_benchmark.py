@@ -0,0 +1,124 @@
+# 전처리 벤치마크: 기존 PIL ImageEnhance 방식과 NumPy/OpenCV 방식(preprocess.py)의
+# 페이지당 처리 시간과 최대 메모리 증가량을 media/ 이미지로 비교하고,
+# 고정 2배 확대와 자동 배율('auto')의 배율/업로드 크기(PNG 바이트)를 비교
+# 실행: python python_test/preprocess_benchmark.py (프로젝트 루트에서)
+
+import glob
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocess import preprocess_image  # noqa: E402
+
+MEDIA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "media")
+# 기존 방식과 같은 결과가 되도록 고정 2배, 크기 제한 없음
+PARAMS = {
+    "contrast": 2, "resize": 2, "sharpness": 2, "binarize": False,
+    "target_dpi": 240, "text_height_pt": 5.4, "default_scale": 2, "min_scale": 0.5, "max_scale": 3,
+    "max_side": 10 ** 6, "max_pixels": 10 ** 12,
+}
+AUTO_PARAMS = dict(PARAMS, resize="auto", max_side=6000, max_pixels=30_000_000)
+REPEAT = 3
+
+
+def preprocess_image_pil(image):
+    """기존 models.preprocess_image (PIL ImageEnhance 체인, 디버그 PNG 저장 제외)"""
+    if image.mode == 'RGBA':
+        image = image.convert('RGB')
+    image = image.convert("L")
+    image = ImageEnhance.Contrast(image).enhance(PARAMS['contrast'])
+    image = image.resize((image.width * PARAMS['resize'], image.height * PARAMS['resize']))
+    image = ImageEnhance.Sharpness(image).enhance(PARAMS['sharpness'])
+    return image
+
+
+def preprocess_image_numpy(image):
+    return preprocess_image(image, PARAMS)[0]
+
+
+def png_size(image):
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.tell()
+
+
+METHODS = {"pil": preprocess_image_pil, "numpy": preprocess_image_numpy}
+
+
+def load_images():
+    paths = []
+    for pattern in ("*.jpg", "*.JPG", "*.png", "*.PNG"):
+        paths.extend(glob.glob(os.path.join(MEDIA_DIR, pattern)))
+    return sorted(set(paths))
+
+
+def run_method(name, paths, queue):
+    """별도 프로세스에서 실행: 이미지별 평균 처리 시간과 최대 RSS 증가량(KB) 측정"""
+    func = METHODS[name]
+    images = [Image.open(path).convert("RGB") for path in paths]
+    func(images[0])  # 워밍업
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    timings = []
+    for image in images:
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            func(image)
+        timings.append((time.perf_counter() - start) / REPEAT * 1000)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((timings, peak - baseline))
+
+
+def main():
+    paths = load_images()
+    if not paths:
+        print("media/ 폴더에 이미지가 없습니다.")
+        return
+
+    results = {}
+    for name in METHODS:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_method, args=(name, paths, queue))
+        process.start()
+        results[name] = queue.get()
+        process.join()
+
+    print(f"{'파일':<40} {'크기':>12} {'PIL(ms)':>10} {'NumPy(ms)':>10} {'차이(평균)':>10}")
+    for index, path in enumerate(paths):
+        image = Image.open(path).convert("RGB")
+        diff = np.abs(
+            np.asarray(preprocess_image_pil(image), dtype=np.int16) - np.asarray(preprocess_image_numpy(image), dtype=np.int16)
+        ).mean()
+        size = f"{image.width}x{image.height}"
+        print(
+            f"{os.path.basename(path)[:40]:<40} {size:>12} "
+            f"{results['pil'][0][index]:>10.1f} {results['numpy'][0][index]:>10.1f} {diff:>10.2f}"
+        )
+
+    for name, (timings, peak_kb) in results.items():
+        print(f"{name}: 페이지당 평균 {sum(timings) / len(timings):.1f} ms, 최대 메모리 증가 {peak_kb / 1024:.1f} MB")
+
+    print()
+    print(f"{'파일':<40} {'auto 배율':>10} {'2x PNG(KB)':>12} {'auto PNG(KB)':>12}")
+    total_fixed = total_auto = 0
+    for path in paths:
+        image = Image.open(path).convert("RGB")
+        fixed_bytes = png_size(preprocess_image(image, PARAMS)[0])
+        auto_image, scale = preprocess_image(image, AUTO_PARAMS)
+        auto_bytes = png_size(auto_image)
+        total_fixed += fixed_bytes
+        total_auto += auto_bytes
+        print(f"{os.path.basename(path)[:40]:<40} {scale:>10.2f} {fixed_bytes / 1024:>12.0f} {auto_bytes / 1024:>12.0f}")
+    print(f"업로드 크기 합계: 2x {total_fixed / 1024 / 1024:.1f} MB, auto {total_auto / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
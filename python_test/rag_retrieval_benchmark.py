@@ -0,0 +1,79 @@
+# RAG 검색 벤치마크: 고정 질문 목록으로 벡터 검색만, 키워드 검색만, 순차 하이브리드, 동시 하이브리드(hybrid_search)의
+# 지연 시간(중앙값/p95)과, 하이브리드 상위 k개 중 벡터 검색만으로는 찾지 못한 청크 수를 비교
+# 실행: python python_test/rag_retrieval_benchmark.py [질문 파일(한 줄에 하나)] (프로젝트 루트에서, MongoDB/Chroma/API 키 필요)
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import search  # noqa: E402,F401  (검색 인덱스 갱신 훅 등록)
+from search import sync_search_index  # noqa: E402
+from hybrid_search import chunk_id, hybrid_search, lexical_search, reciprocal_rank_fusion, vector_search  # noqa: E402
+from rag import RAG_FETCH_K, RAG_TOP_K, get_or_create_chroma_index  # noqa: E402
+
+# 문서 번호, 회사명, 금액처럼 정확히 일치해야 하는 질문과 일반 질문을 섞은 기본 질문 목록
+QUERIES = [
+    "헌혈 증서 번호",
+    "봉사 활동 확인서 발급 기관",
+    "견적서 총 금액",
+    "주식회사 계약 당사자",
+    "사업자등록번호",
+    "지난달 업로드한 영수증 합계",
+    "재직 증명서 근무 기간",
+    "세금계산서 공급가액",
+]
+REPEAT = 5
+
+
+def load_queries():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    return QUERIES
+
+
+def sequential_hybrid(chroma_db, query):
+    vector = vector_search(chroma_db, query, RAG_FETCH_K)
+    lexical = lexical_search(chroma_db, query, RAG_FETCH_K)
+    return reciprocal_rank_fusion([vector, lexical])[:RAG_TOP_K]
+
+
+def measure(name, function, chroma_db, queries):
+    latencies = []
+    for _ in range(REPEAT):
+        for query in queries:
+            start = time.perf_counter()
+            function(chroma_db, query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:>18}: 중앙값 {statistics.median(latencies):7.1f} ms, p95 {p95:7.1f} ms")
+
+
+def main():
+    queries = load_queries()
+    sync_search_index()
+    chroma_db = get_or_create_chroma_index()
+
+    # 질문 임베딩은 디스크 캐시에 저장되므로 한 번씩 미리 실행하여 모든 방식이 같은 조건에서 측정되도록 함
+    for query in queries:
+        hybrid_search(chroma_db, query, RAG_TOP_K, RAG_FETCH_K)
+
+    print(f"질문 {len(queries)}개 x {REPEAT}회, k={RAG_TOP_K}, fetch_k={RAG_FETCH_K}")
+    measure("vector", lambda db, q: vector_search(db, q, RAG_TOP_K), chroma_db, queries)
+    measure("lexical", lambda db, q: lexical_search(db, q, RAG_TOP_K), chroma_db, queries)
+    measure("hybrid sequential", sequential_hybrid, chroma_db, queries)
+    measure("hybrid concurrent", lambda db, q: hybrid_search(db, q, RAG_TOP_K, RAG_FETCH_K), chroma_db, queries)
+
+    print("\n하이브리드 상위 k개 중 벡터 검색 상위 k개에 없던 청크 수")
+    for query in queries:
+        vector_ids = {chunk_id(document) for document in vector_search(chroma_db, query, RAG_TOP_K)}
+        hybrid_ids = [chunk_id(document) for document in hybrid_search(chroma_db, query, RAG_TOP_K, RAG_FETCH_K)]
+        added = sum(1 for hybrid_id in hybrid_ids if hybrid_id not in vector_ids)
+        print(f"  {query}: {added}/{len(hybrid_ids)}")
+
+
+if __name__ == "__main__":
+    main()
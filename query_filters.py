@@ -0,0 +1,116 @@
+from datetime import datetime
+import json
+import os
+import re
+
+import pytz
+
+from cache import MemoryCache
+from models import call_gpt_api, data_collection, date_range_to_epoch
+
+# 질문에서 날짜/파일명/문서 종류 조건을 추출할지 여부
+RAG_QUERY_FILTERS = os.getenv("RAG_QUERY_FILTERS", "1") == "1"
+# 문서 종류 목록을 다시 조회하는 주기 (초)
+DOCUMENT_TYPES_TTL = int(os.getenv("DOCUMENT_TYPES_TTL", "300"))
+document_types_cache = MemoryCache(1, DOCUMENT_TYPES_TTL)
+
+
+def known_document_types():
+    """data 문서에 저장된 문서 종류(doc_type) 목록"""
+    document_types = document_types_cache.get("doc_types")
+    if document_types is None:
+        document_types = sorted(value for value in data_collection.distinct("doc_type") if value)
+        document_types_cache.set("doc_types", document_types)
+    return document_types
+
+
+def today_kst():
+    """현재 한국 표준시(KST) 기준 날짜 'YYYY-MM-DD'"""
+    return datetime.now(pytz.timezone('Asia/Seoul')).strftime("%Y-%m-%d")
+
+
+def parse_date(value):
+    """'YYYY-MM-DD' 문자열이면 그대로, 아니면 None"""
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def generate_query_filters(query_text):
+    """GPT API로 자연어 질문을 검색 문장과 구조화된 조건으로 변환
+
+    반환: {"query": 날짜 등 조건을 뺀 검색 문장, "start_date", "end_date": 'YYYY-MM-DD' 또는 None,
+           "filename": 파일명에 들어갈 문자열 목록, "doc_type": 문서 종류 목록 중 하나 또는 None}
+    """
+    # 날짜만 넣어야 같은 날 같은 질문은 call_gpt_api 캐시에서 바로 반환됨 (시각까지 넣으면 매번 다른 프롬프트)
+    datenow = today_kst()
+    document_types = known_document_types()
+
+    query_payload = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {
+                "role": "user",
+                "content": (
+                    f"다음 질문을 문서 검색 조건으로 바꿔서 JSON으로만 답해줘.\n"
+                    f"\"query\": 날짜, 파일명, 문서 종류 조건을 뺀 나머지 내용을 임베딩하기 쉽게 개조식으로 표현한 문자열\n"
+                    f"\"start_date\", \"end_date\": 질문에 업로드 시기가 있으면 오늘 날짜 {datenow}를 참고한 "
+                    f"절대 날짜 'YYYY-MM-DD' (end_date는 그날 포함), 없으면 null. "
+                    f"예를 들어, 2024년 11월에 '지난달 문서'는 start_date 2024-10-01, end_date 2024-10-31\n"
+                    f"\"filename\": 질문에 파일명이 언급되면 파일명에 들어갈 문자열 목록, 없으면 []\n"
+                    f"\"doc_type\": 질문이 특정 종류의 문서를 찾으면 다음 목록 중 하나를 그대로, 없거나 애매하면 null: "
+                    f"{json.dumps(document_types, ensure_ascii=False)}\n\n{query_text}"
+                )
+            }
+        ],
+        "response_format": {"type": "json_object"},
+        "max_tokens": 200
+    }
+
+    result = json.loads(call_gpt_api(query_payload))
+    filenames = result.get("filename") or []
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    doc_type = result.get("doc_type")
+    return {
+        "query": str(result.get("query") or query_text),
+        "start_date": parse_date(result.get("start_date")),
+        "end_date": parse_date(result.get("end_date")),
+        "filename": [str(filename).strip() for filename in filenames if str(filename).strip()],
+        "doc_type": doc_type if doc_type in document_types else None,  # 목록에 없는 값은 무시
+    }
+
+
+def build_search_filters(query_text, start_date=None, end_date=None):
+    """질문과 요청 인자로 검색 문장과 메타데이터 필터를 만듦 (요청 인자로 받은 날짜가 질문에서 추출한 날짜보다 우선)
+
+    반환: (검색 문장, {"start_ts", "end_ts", "data_ids", "doc_type"}) — 값이 None인 조건은 적용하지 않음
+    """
+    search_query = query_text
+    filenames = []
+    doc_type = None
+    if RAG_QUERY_FILTERS:
+        try:
+            extracted = generate_query_filters(query_text)
+            search_query = extracted["query"]
+            start_date = start_date or extracted["start_date"]
+            end_date = end_date or extracted["end_date"]
+            filenames = extracted["filename"]
+            doc_type = extracted["doc_type"]
+        except Exception as e:
+            # 조건 추출에 실패하면 조건 없이 원래 질문으로 검색
+            print(f"쿼리 변환 중 오류 발생: {str(e)}")
+
+    start_ts, end_ts = date_range_to_epoch(start_date, end_date)
+
+    # 파일명 조건은 Chroma에서 부분 일치를 할 수 없으므로 MongoDB에서 data _id 목록으로 바꿈
+    data_ids = None
+    if filenames:
+        pattern = "|".join(re.escape(filename) for filename in filenames)
+        data_ids = tuple(sorted(
+            str(doc["_id"])
+            for doc in data_collection.find({"filename": {"$regex": pattern, "$options": "i"}}, {"_id": 1})
+        ))
+
+    return search_query, {"start_ts": start_ts, "end_ts": end_ts, "data_ids": data_ids, "doc_type": doc_type}
@@ -1,83 +1,352 @@
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-from langchain.chains import RetrievalQA
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain.chains.question_answering import load_qa_chain
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_openai import ChatOpenAI
-from models import data_collection, api_key
+from models import data_collection, api_key, on_data_saved, to_epoch, date_range_to_epoch, document_type
 from langchain.schema import Document
+from embeddings import embed_texts
+from cache import SemanticCache
+from chunking import chunk_text, merge_chunk_spans
+from hybrid_search import hybrid_search
+from query_filters import build_search_filters
+from bson import ObjectId
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import json
 import os
+import queue
+import threading
+import time
 
 rag = Blueprint('rag', __name__)
 
 # Chroma 데이터 저장 디렉토리 설정
-CHROMA_DIR = "/chroma_data"
+CHROMA_DIR = os.getenv("CHROMA_DIR", "/chroma_data")
+# 누락된 문서를 찾아 색인하는 주기 (초)
+RAG_RECONCILE_INTERVAL = int(os.getenv("RAG_RECONCILE_INTERVAL", "300"))
+# 한 번에 임베딩하여 저장할 청크(또는 DB에서 가져올 문서) 수
+RAG_INDEX_BATCH_SIZE = int(os.getenv("RAG_INDEX_BATCH_SIZE", "64"))
+# 질문마다 프롬프트에 넣을 청크 수 (키워드/벡터 검색에서 각각 fetch_k개를 가져와 합친 뒤 k개 선택)
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "6"))
+RAG_FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))
+
+# 답변 캐시: 이전 질문과 임베딩 유사도가 임계값 이상이면 저장된 답변을 그대로 반환
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+# 새 문서가 추가되어도 답변이 너무 오래 유지되지 않도록 만료 시간 설정 (초)
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 60 * 60)))
+answer_cache = SemanticCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL)
+
+# Chroma 쓰기는 워커 하나에서 순서대로 처리 (문서 저장 요청은 임베딩을 기다리지 않음)
+rag_index_executor = ThreadPoolExecutor(max_workers=1)
+# /rag/stream에서 LLM 호출을 실행하는 풀 (동시에 스트리밍할 수 있는 답변 수)
+rag_stream_executor = ThreadPoolExecutor(max_workers=int(os.getenv("RAG_STREAM_WORKERS", "8")))
+
+def data_to_documents(doc):
+    """data 문서를 Chroma에 저장할 청크 Document 목록으로 변환 (OCR 텍스트가 없으면 빈 목록)
+
+    청크는 페이지/문단 경계로 나누며, 답변 시 원문 순서대로 다시 합칠 수 있도록 위치 정보를 메타데이터에 저장한다.
+    """
+    ocr_text = doc.get('ocr_text')
+    if not ocr_text:
+        return []
+
+    upload_date = doc.get('upload_date')
+    upload_ts = None
+    if isinstance(upload_date, datetime):
+        upload_ts = to_epoch(upload_date)  # 날짜 범위 필터용 숫자 값
+        upload_date = upload_date.isoformat()
+
+    documents = []
+    for chunk_index, chunk in enumerate(chunk_text(ocr_text)):
+        metadata = {
+            "upload_date": upload_date,
+            "filename": doc.get('filename'),
+            "data_id": str(doc['_id']),
+            "upload_id": str(doc.get('upload_id', '')),
+            "chunk_index": chunk_index,
+            "page": chunk["page"],
+            "start": chunk["start"],
+            "end": chunk["end"],
+            # 문서 종류 필터용 (formatted_data의 '문서 형식')
+            "doc_type": doc.get('doc_type') or document_type(doc.get('formatted_data')),
+        }
+        if upload_ts is not None:
+            metadata["upload_ts"] = upload_ts
+        documents.append(Document(page_content=chunk["text"], metadata=metadata))
+    return documents
 
 # 데이터 로딩 함수
-def load_from_data_collection():
+def load_from_data_collection(query=None):
     documents = []
-    for doc in data_collection.find():
-        page_content = doc.get('ocr_text')
-        upload_date = doc.get('upload_date')
-        filename = doc.get('filename')
-
-        if isinstance(upload_date, datetime):
-            upload_date = upload_date.isoformat()
-        
-        metadata = {"upload_date": upload_date, "filename": filename}
-        documents.append(Document(page_content=page_content, metadata=metadata))
+    for doc in data_collection.find(query or {}, {"ocr_text": 1, "upload_date": 1, "filename": 1, "upload_id": 1, "doc_type": 1, "formatted_data": 1}):
+        documents.extend(data_to_documents(doc))
     return documents
 
-# Chroma 벡터 저장소 생성 또는 로드 함수
-def get_or_create_chroma_index():
-    # Chroma 데이터 디렉토리가 존재하고 비어 있지 않으면 로드
-    if os.path.exists(CHROMA_DIR) and os.listdir(CHROMA_DIR):
-        embeddings_model = OpenAIEmbeddings(openai_api_key=api_key)
-        chroma_db = Chroma(persist_directory=CHROMA_DIR, embedding_function=embeddings_model)
-    else:
-        # 없을 경우 새로 생성 및 저장
-        documents = load_from_data_collection()
-        if not documents:
-            raise ValueError("No documents found in the data collection to index.")
-        
-        embeddings_model = OpenAIEmbeddings(openai_api_key=api_key)
-        chroma_db = Chroma.from_documents(documents, embeddings_model, persist_directory=CHROMA_DIR)
-        chroma_db.persist()  # 데이터를 디스크에 저장
-    return chroma_db
+# 임베딩 모델, Chroma 저장소, LLM, QA 체인은 프로세스당 한 번만 생성하여 모든 요청이 공유
+rag_resources = {}
+rag_resources_lock = threading.Lock()
 
-# 쿼리 처리 및 검색 함수
-def query_data_collection(query):
-    chroma_db = get_or_create_chroma_index()
+def get_rag_resource(name, factory):
+    """name에 해당하는 객체를 처음 요청될 때 한 번만 생성하여 반환 (스레드 안전)"""
+    resource = rag_resources.get(name)
+    if resource is None:
+        with rag_resources_lock:
+            resource = rag_resources.get(name)
+            if resource is None:
+                resource = rag_resources[name] = factory()
+    return resource
 
-    openai = ChatOpenAI(
+class CachedEmbeddings(Embeddings):
+    """embeddings.embed_texts를 사용하는 LangChain 임베딩 (배치 요청 + 디스크 캐시로 이미 임베딩한 텍스트는 다시 요청하지 않음)"""
+
+    def embed_documents(self, texts):
+        return embed_texts(texts)
+
+    def embed_query(self, text):
+        return embed_texts([text])[0]
+
+def get_embeddings_model():
+    return get_rag_resource("embeddings", CachedEmbeddings)
+
+# Chroma 벡터 저장소 로드 함수 (문서는 index_documents로 점진적으로 추가)
+def get_or_create_chroma_index():
+    return get_rag_resource(
+        "chroma", lambda: Chroma(persist_directory=CHROMA_DIR, embedding_function=get_embeddings_model())
+    )
+
+def get_llm():
+    return get_rag_resource("llm", lambda: ChatOpenAI(
         model_name="gpt-4o-mini",
         openai_api_key=api_key,
         streaming=True,
-        callbacks=[StreamingStdOutCallbackHandler()],
         temperature=0
-    )
+    ))
+
+def get_qa_chain():
+    # 검색은 hybrid_search로 따로 하고, 청크를 문서별로 합친 결과만 프롬프트에 넣음
+    return get_rag_resource("qa", lambda: load_qa_chain(get_llm(), chain_type="stuff"))
+
+def warm_up_rag():
+    """앱 시작 시 호출: RAG에 필요한 객체를 미리 생성하고 각 단계의 소요 시간을 출력"""
+    timings = {}
+    for name, factory in (
+        ("embeddings", get_embeddings_model),
+        ("chroma", get_or_create_chroma_index),
+        ("llm", get_llm),
+        ("qa", get_qa_chain),
+    ):
+        start = time.perf_counter()
+        try:
+            factory()
+        except Exception as e:
+            print(f"Error warming up {name}: {str(e)}")
+            break
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    print(f"RAG 초기화 시간(ms): {timings}")
+    return timings
+
+def index_documents(documents):
+    """청크 Document 목록을 'data _id:청크 번호'를 키로 Chroma에 upsert (같은 문서를 다시 넣어도 중복되지 않음)
+
+    다시 색인된 문서를 출처로 하는 캐시된 답변은 삭제한다.
+    """
+    if not documents:
+        return
+    answer_cache.invalidate({document.metadata["data_id"] for document in documents})
+    chroma_db = get_or_create_chroma_index()
+    for start in range(0, len(documents), RAG_INDEX_BATCH_SIZE):
+        batch = documents[start:start + RAG_INDEX_BATCH_SIZE]
+        chroma_db.add_documents(
+            batch, ids=[f"{document.metadata['data_id']}:{document.metadata['chunk_index']}" for document in batch]
+        )
+
+@on_data_saved
+def index_saved_document(data_doc):
+    """새로 저장된 data 문서를 백그라운드에서 Chroma에 추가"""
+    documents = data_to_documents(data_doc)
+    if not documents:
+        return
+
+    def run():
+        try:
+            index_documents(documents)
+        except Exception as e:
+            # 실패한 문서는 다음 reconcile_chroma_index에서 다시 색인됨
+            print(f"Error indexing document {data_doc['_id']}: {str(e)}")
+
+    rag_index_executor.submit(run)
+
+def reconcile_chroma_index(page_size=1000):
+    """Chroma와 data 컬렉션을 비교하여 누락된 문서만 임베딩하고, 없어진 문서와 이전 형식 항목은 삭제
+
+    청크가 아닌 문서 전체 항목이나 필터용 메타데이터(upload_ts, doc_type)가 없는 청크는 다시 색인한다 (임베딩은 디스크 캐시에서 재사용).
+    """
+    chroma_db = get_or_create_chroma_index()
+
+    entry_ids = {}  # data_id -> 청크 항목 ID 목록
+    stale_ids = []
+    offset = 0
+    while True:
+        entries = chroma_db.get(include=["metadatas"], limit=page_size, offset=offset)
+        for entry_id, metadata in zip(entries["ids"], entries["metadatas"]):
+            metadata = metadata or {}
+            if metadata.get("data_id") and all(key in metadata for key in ("chunk_index", "upload_ts", "doc_type")):
+                entry_ids.setdefault(metadata["data_id"], []).append(entry_id)
+            else:
+                stale_ids.append(entry_id)
+        if len(entries["ids"]) < page_size:
+            break
+        offset += page_size
+
+    data_ids = {str(doc["_id"]) for doc in data_collection.find({}, {"_id": 1})}
+    missing_ids = data_ids - set(entry_ids)
+    deleted_ids = set(entry_ids) - data_ids
+    for data_id in deleted_ids:
+        stale_ids += entry_ids[data_id]
+
+    if stale_ids:
+        chroma_db.delete(ids=stale_ids)
+        answer_cache.invalidate(deleted_ids)
+
+    missing = sorted(missing_ids)
+    indexed = 0
+    for start in range(0, len(missing), RAG_INDEX_BATCH_SIZE):
+        batch = [ObjectId(data_id) for data_id in missing[start:start + RAG_INDEX_BATCH_SIZE]]
+        documents = load_from_data_collection({"_id": {"$in": batch}})
+        index_documents(documents)
+        indexed += len(documents)
+
+    if missing or stale_ids:
+        print(f"Chroma 색인 동기화: 문서 {len(missing)}건 추가 (청크 {indexed}개), 항목 {len(stale_ids)}개 삭제")
+
+def start_rag_indexer():
+    """앱 시작 시 호출: 주기적으로 reconcile_chroma_index를 실행하는 백그라운드 스레드 시작"""
+    def run():
+        while True:
+            try:
+                rag_index_executor.submit(reconcile_chroma_index).result()
+            except Exception as e:
+                print(f"Error in reconcile_chroma_index: {str(e)}")
+            time.sleep(RAG_RECONCILE_INTERVAL)
+
+    threading.Thread(target=run, name="rag-indexer", daemon=True).start()
+
+def reassemble_chunks(chunks):
+    """검색된 청크들을 문서(data_id)별로 모아 원문 순서대로 합친 Document 목록 반환 (겹치는 부분은 한 번만 포함)
+
+    문서 순서는 각 문서의 청크가 처음 검색된 순위를 따른다.
+    """
+    groups = {}
+    for chunk in chunks:
+        # 위치 정보가 없는 이전 형식 항목은 그대로 사용
+        key = chunk.metadata.get("data_id") if "start" in chunk.metadata else id(chunk)
+        groups.setdefault(key, []).append(chunk)
+
+    documents = []
+    for group in groups.values():
+        metadata = group[0].metadata
+        if "start" not in metadata:
+            documents.append(group[0])
+            continue
+
+        spans = merge_chunk_spans([
+            {"text": chunk.page_content, "page": chunk.metadata["page"],
+             "start": chunk.metadata["start"], "end": chunk.metadata["end"]}
+            for chunk in group
+        ])
+        page_content = "\n...\n".join(
+            f"[페이지 {', '.join(map(str, sorted(span['pages'])))}]\n{span['text']}" for span in spans
+        )
+        documents.append(Document(page_content=page_content, metadata={
+            "filename": metadata.get("filename"),
+            "upload_date": metadata.get("upload_date"),
+            "data_id": metadata.get("data_id"),
+            "upload_id": metadata.get("upload_id"),
+            "pages": sorted({page for span in spans for page in span["pages"]}),
+        }))
+    return documents
+
+def retrieve_source_documents(query, filters=None):
+    """질문에 관련된 청크를 검색하여 문서별로 합친 Document 목록 반환 (filters는 hybrid_search.metadata_filter 참고)"""
+    # 키워드 검색(로컬 n-gram 인덱스)과 벡터 검색을 동시에 실행하여 RRF로 합침
+    chunks = hybrid_search(get_or_create_chroma_index(), query, RAG_TOP_K, RAG_FETCH_K, filters)
+    source_documents = reassemble_chunks(chunks)
+    context_chars = sum(len(document.page_content) for document in source_documents)
+    print(f"검색된 청크 {len(chunks)}개 -> 문서 {len(source_documents)}개, 프롬프트 문맥 {context_chars}자")
+    return source_documents
 
-    qa = RetrievalQA.from_chain_type(
-        llm=openai,
-        chain_type="stuff",
-        retriever=chroma_db.as_retriever(search_type="mmr", search_kwargs={'k': 3, 'fetch_k': 10}),
-        return_source_documents=True
+# 쿼리 처리 및 검색 함수
+def query_data_collection(query, search_query=None, filters=None, callbacks=None):
+    # 검색은 조건을 뺀 검색 문장으로, 답변은 원래 질문으로
+    source_documents = retrieve_source_documents(search_query or query, filters)
+    result = get_qa_chain().invoke(
+        {"input_documents": source_documents, "question": query}, config={"callbacks": callbacks or []}
     )
+    return {"result": result["output_text"], "source_documents": source_documents}
 
-    result = qa(query)
-    return result
+def format_sources(source_documents):
+    """문서 내용과 메타데이터가 반환될 수 있도록 변환"""
+    return [
+        {
+            "filename": doc.metadata.get("filename", "Unknown filename"),
+            "upload_date": doc.metadata.get("upload_date", "Unknown date"),
+            "page_content": doc.page_content,
+            "metadata": doc.metadata,
+        }
+        for doc in source_documents
+    ]
 
-@rag.route('/rag', methods=['GET'])
-def rag_route():
+def parse_rag_request():
+    """요청 인자에서 (질문, 시작 날짜, 끝 날짜) 추출 (날짜 형식이 잘못되면 ValueError)"""
     query = request.args.get('query', type=str)
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
     print(f"Received query: {query}")  # 쿼리 로그 확인
 
+    date_range_to_epoch(start_date, end_date)  # 날짜 형식 확인
+    return query, start_date, end_date
+
+def filter_scope(filters):
+    """답변 캐시에서 같은 조건의 질문끼리만 비교하기 위한 값
+
+    질문에서 추출한 조건(절대 날짜 범위, 파일명, 문서 종류)을 사용하므로 '지난달'/'이번달'이나 회사명처럼
+    임베딩은 비슷하지만 조건이 다른 질문끼리는 답변을 공유하지 않는다.
+    """
+    return tuple(sorted(filters.items()))
+
+def cache_answer(query_vector, scope, answer, source_documents):
+    """답변을 캐시에 저장 (출처 문서 ID를 태그로 달아 해당 문서가 다시 색인되면 삭제되도록 함)"""
+    response = {"results": answer, "sources": format_sources(source_documents)}
+    answer_cache.set(query_vector, response, scope, tags={doc.metadata.get("data_id") for doc in source_documents})
+    return response
+
+@rag.route('/rag', methods=['GET'])
+def rag_route():
+    try:
+        query, start_date, end_date = parse_rag_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if not query:
         return jsonify({"error": "Query parameter is missing"}), 400
 
     try:
-        result = query_data_collection(query)
+        # 질문에서 날짜/파일명/문서 종류 조건을 추출하여 Chroma 검색 전에 적용
+        # (같은 날 같은 질문이면 조건 추출 결과는 call_gpt_api 캐시에서 바로 반환됨)
+        search_query, filters = build_search_filters(query, start_date, end_date)
+        print(f"검색 문장: {search_query}, 조건: {filters}")
+
+        # 같은 조건에서 비슷한 질문의 답변이 캐시에 있으면 LLM 호출 없이 반환
+        query_vector = embed_texts([query])[0]
+        scope = filter_scope(filters)
+        cached, similarity = answer_cache.get(query_vector, scope)
+        if cached is not None:
+            print(f"답변 캐시 적중 (유사도 {similarity:.3f})")
+            return jsonify({**cached, "cached": True})
+
+        result = query_data_collection(query, search_query, filters)
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
 
@@ -88,21 +357,94 @@ def rag_route():
     if not answer or not source_documents or not isinstance(source_documents, list) or len(source_documents) == 0:
         return jsonify({"error": "Incomplete response generated. Please try again."}), 500
 
-    # 문서 내용과 메타데이터가 반환될 수 있도록 변환
-    formatted_results = []
-    for doc in source_documents:
-        formatted_results.append({
-            "filename": doc.metadata.get("filename", "Unknown filename"),
-            "upload_date": doc.metadata.get("upload_date", "Unknown date"),
-            "page_content": doc.page_content,
-            "metadata": doc.metadata,
-        })
+    response = cache_answer(query_vector, scope, answer, source_documents)
 
     # 결과 출력
-    print("Formatted Results:", formatted_results)
+    print("Formatted Results:", response["sources"])
     print("Answer:", answer)
 
-    return jsonify({
-        "results": answer,  # 'result'는 항상 유효함
-        "sources": formatted_results,  # 'sources'도 항상 유효함
-    })
+    return jsonify({**response, "cached": False})
+
+class QueueCallbackHandler(BaseCallbackHandler):
+    """LLM이 생성하는 토큰을 큐에 넣는 콜백 (스트리밍 응답용)"""
+
+    def __init__(self, token_queue):
+        self.token_queue = token_queue
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.token_queue.put(("token", token))
+
+def sse_event(event, data):
+    """Server-Sent Events 형식의 이벤트 문자열"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@rag.route('/rag/stream', methods=['GET'])
+def rag_stream_route():
+    """답변 토큰을 생성되는 대로 SSE(token 이벤트)로 보내고, 마지막에 출처 문서(sources 이벤트)를 보내는 엔드포인트"""
+    try:
+        query, start_date, end_date = parse_rag_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not query:
+        return jsonify({"error": "Query parameter is missing"}), 400
+
+    def generate():
+        try:
+            search_query, filters = build_search_filters(query, start_date, end_date)
+            print(f"검색 문장: {search_query}, 조건: {filters}")
+
+            query_vector = embed_texts([query])[0]
+            scope = filter_scope(filters)
+            cached, similarity = answer_cache.get(query_vector, scope)
+            if cached is not None:
+                print(f"답변 캐시 적중 (유사도 {similarity:.3f})")
+                yield sse_event("token", cached["results"])
+                yield sse_event("sources", {"sources": cached["sources"], "cached": True})
+                return
+
+            source_documents = retrieve_source_documents(search_query, filters)
+            if not source_documents:
+                yield sse_event("error", {"error": "관련 문서를 찾을 수 없습니다."})
+                return
+
+            # LLM 호출은 별도 스레드에서 실행하고, 콜백이 큐에 넣은 토큰을 바로 전송
+            token_queue = queue.Queue()
+
+            def run_chain():
+                try:
+                    result = get_qa_chain().invoke(
+                        {"input_documents": source_documents, "question": query},
+                        config={"callbacks": [QueueCallbackHandler(token_queue)]},
+                    )
+                    token_queue.put(("done", result["output_text"]))
+                except Exception as e:
+                    token_queue.put(("error", str(e)))
+
+            rag_stream_executor.submit(run_chain)
+
+            while True:
+                kind, value = token_queue.get()
+                if kind == "token":
+                    if value:
+                        yield sse_event("token", value)
+                elif kind == "error":
+                    yield sse_event("error", {"error": value})
+                    return
+                else:
+                    response = cache_answer(query_vector, scope, value, source_documents)
+                    yield sse_event("sources", {"sources": response["sources"], "cached": False})
+                    return
+        except Exception as e:
+            print(f"Error in rag_stream: {str(e)}")
+            yield sse_event("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # 프록시 버퍼링 방지
+    )
+
+@rag.route('/rag/cache', methods=['GET'])
+def rag_cache_route():
+    """답변 캐시 적중률 등 통계"""
+    return jsonify(answer_cache.stats())
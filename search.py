@@ -1,104 +1,228 @@
-from flask import Blueprint, request, jsonify
-from models import data_collection, fs
-import base64
+from flask import Blueprint, Response, request, jsonify, url_for, stream_with_context
+from models import data_collection, normalize_search_text, query_ngrams, on_data_saved, to_epoch, SEARCH_BACKEND
+from search_index import search_index
+from bson import ObjectId
 from datetime import datetime, timedelta
+import base64
+import json
 import pytz
+import re
 
 search = Blueprint('search', __name__)
 
+@on_data_saved
+def index_saved_document(data_doc):
+    """새로 저장된 data 문서를 로컬 검색 인덱스에 추가"""
+    search_index.add_document(data_doc["_id"], to_epoch(data_doc["upload_date"]), data_doc["search_text"])
+
+def sync_search_index(batch_size=500):
+    """앱 시작 시 호출: 로컬 검색 인덱스에 없는 data 문서만 색인"""
+    search_index.refresh()  # 다른 프로세스가 이미 색인한 문서는 건너뜀
+    missing = [doc["_id"] for doc in data_collection.find({}, {"_id": 1}) if doc["_id"] not in search_index]
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        for doc in data_collection.find({"_id": {"$in": batch}}, {"search_text": 1, "upload_date": 1}):
+            search_index.add_document(doc["_id"], to_epoch(doc["upload_date"]), doc.get("search_text", ""))
+    if missing:
+        print(f"검색 인덱스에 문서 {len(missing)}건 추가")
+
+# 한 번에 반환할 검색 결과 수
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+class InvalidCursorError(ValueError):
+    """검색 커서를 해석할 수 없을 때 발생하는 예외"""
+
+def encode_cursor(result, relevance=False):
+    """마지막 결과의 정렬 키(upload_date, _id, 관련도 정렬이면 score 포함)를 불투명한 커서 문자열로 변환"""
+    key = {"d": result["upload_date"].isoformat(), "i": str(result["_id"])}
+    if relevance:
+        key["s"] = result["score"]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor, relevance=False):
+    """커서 문자열을 정렬 키 (score, upload_date, _id)로 복원 (최신순 커서의 score는 None)"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        score = key["s"] if relevance else None
+        if not relevance and "s" in key:
+            raise ValueError("정렬 방식이 다른 커서")
+        return score, datetime.fromisoformat(key["d"]), ObjectId(key["i"])
+    except Exception:
+        raise InvalidCursorError("잘못된 커서입니다.")
+
+def cursor_condition(cursor, relevance=False):
+    """정렬 순서((score,) upload_date, _id 내림차순)에서 커서 다음에 오는 문서 조건"""
+    score, upload_date, data_id = decode_cursor(cursor, relevance)
+    after_date = [
+        {"upload_date": {"$lt": upload_date}},
+        {"upload_date": upload_date, "_id": {"$lt": data_id}},
+    ]
+    if not relevance:
+        return {"$or": after_date}
+    return {"$or": [{"score": {"$lt": score}}] + [dict(condition, score=score) for condition in after_date]}
+
+def format_search_result(result):
+    """aggregation 결과 문서를 응답 형식으로 변환"""
+    image_url, thumbnail_url = build_image_urls(result.get('image_id'))
+    return {
+        "filename": result['filename'],
+        "summary": result['summary'],
+        "upload_date": result['upload_date'].strftime("%Y-%m-%d %H:%M:%S"),
+        "image_url": image_url,
+        "thumbnail_url": thumbnail_url,
+        "formatted_data": result['formatted_data'],
+        "score": result['score']
+    }
+
 @search.route('/search', methods=['GET'])
 def search_route():
     query = request.args.get('query', '').strip()
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    limit = min(max(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+    cursor = request.args.get('cursor')
+    # format=ndjson이면 결과를 한 줄씩 스트리밍
+    stream = request.args.get('format') == 'ndjson'
+    # sort=relevance이면 검색어 등장 횟수순 (기본은 최신순)
+    relevance = request.args.get('sort') == 'relevance'
     print(f"시작 날짜 {start_date}, 끝 날짜 {end_date}")
 
     if not query:
         return jsonify({"error": "검색어가 필요합니다."}), 400
 
+    if stream and relevance:
+        return jsonify({"error": "관련도순 정렬은 format=ndjson을 지원하지 않습니다."}), 400
+
     try:
-        # 키워드 추출 및 정리
-        keywords = [word.strip() for word in query.split('+') if word.strip()]
-
-        # 검색 조건 설정
-        match_conditions = {
-            "$and": [
-                {
-                    "$or": [
-                        {"filename": {"$regex": keyword, "$options": "i"}},
-                        {"ocr_text": {"$regex": keyword, "$options": "i"}},
-                        {"summary": {"$regex": keyword, "$options": "i"}},
-                        {"formatted_data_keys.v": {"$regex": keyword, "$options": "i"}}
-                    ]
-                } for keyword in keywords
-            ]
-        }
+        # 키워드 추출 및 정리 (저장된 search_text와 같은 방식으로 정규화)
+        keywords = [normalize_search_text(word) for word in query.split('+') if word.strip()]
+        patterns = [re.escape(keyword) for keyword in keywords]
 
-        # 날짜 조건 추가
+        # 날짜 조건
+        start_date_dt = end_date_dt = None
         if start_date:
             start_date_dt = datetime.fromisoformat(start_date).replace(tzinfo=pytz.UTC)
-            match_conditions["$and"].append({"upload_date": {"$gte": start_date_dt}})
 
         if end_date:
             end_date_dt = datetime.fromisoformat(end_date).replace(tzinfo=pytz.UTC)
             end_date_dt = end_date_dt.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-            match_conditions["$and"].append({"upload_date": {"$lt": end_date_dt}})
-
-        # Aggregation Pipeline 설정
-        pipeline = [
-            {"$addFields": {"formatted_data_keys": {"$objectToArray": "$formatted_data"}}},
-            {"$unwind": "$formatted_data_keys"},
-            {"$match": match_conditions},
-            {
-                "$group": {
-                    "_id": "$_id",
-                    "filename": {"$first": "$filename"},
-                    "summary": {"$first": "$summary"},
-                    "upload_date": {"$first": "$upload_date"},
-                    "image_id": {"$first": "$image_id"},
-                    "formatted_data": {"$push": "$formatted_data_keys"}
-                }
-            },
-            {
-                "$project": {
-                    "filename": 1,
-                    "summary": 1,
-                    "upload_date": 1,
-                    "image_id": 1,
-                    "formatted_data": 1
+
+        # 검색 조건 설정: 인덱스로 후보 문서를 좁히고 실제 부분 문자열 포함 여부 확인
+        match_conditions = {"$and": [{"search_text": {"$regex": pattern}} for pattern in patterns]}
+
+        if SEARCH_BACKEND == "local":
+            # 로컬 역색인에서 후보 문서 ID를 찾고 (날짜 조건 포함) MongoDB에서는 _id로만 조회
+            candidate_ids = search_index.search(
+                keywords,
+                start_ts=start_date_dt.timestamp() if start_date_dt else None,
+                end_ts=end_date_dt.timestamp() if end_date_dt else None,
+            )
+            match_conditions["_id"] = {"$in": [ObjectId(data_id) for data_id in candidate_ids]}
+        else:
+            match_conditions["search_ngrams"] = {"$all": sorted({gram for keyword in keywords for gram in query_ngrams(keyword)})}
+            upload_date_condition = {}
+            if start_date_dt:
+                upload_date_condition["$gte"] = start_date_dt
+            if end_date_dt:
+                upload_date_condition["$lt"] = end_date_dt
+            if upload_date_condition:
+                match_conditions["upload_date"] = upload_date_condition
+
+        # 관련도: 검색어가 등장한 횟수의 합
+        score_field = {
+            "$addFields": {
+                "score": {
+                    "$add": [
+                        {"$size": {"$regexFindAll": {"input": "$search_text", "regex": pattern}}}
+                        for pattern in patterns
+                    ]
                 }
             }
-        ]
+        }
+        project_stage = {
+            "$project": {
+                "filename": 1,
+                "summary": 1,
+                "upload_date": 1,
+                "image_id": 1,
+                "score": 1,
+                "formatted_data": {"$objectToArray": {"$ifNull": ["$formatted_data", {}]}}
+            }
+        }
+
+        # Aggregation Pipeline 설정 (커서가 있으면 이전 페이지 마지막 결과 다음부터, 건너뛰기 없이 정렬 키로 이어감)
+        # _id까지 포함해 정렬 순서를 고정해야 커서가 결과를 빠뜨리거나 중복하지 않음
+        if relevance:
+            # 관련도순: 모든 후보의 점수를 계산하고 정렬해야 하므로 느리고 스트리밍할 수 없음
+            pipeline = [{"$match": match_conditions}, score_field]
+            if cursor:
+                pipeline.append({"$match": cursor_condition(cursor, relevance=True)})
+            pipeline.append({"$sort": {"score": -1, "upload_date": -1, "_id": -1}})
+        else:
+            # 최신순(기본): {upload_date: -1, _id: -1} 인덱스 순서 그대로 읽고 $limit에서 멈춤
+            if cursor:
+                match_conditions["$and"].append(cursor_condition(cursor))
+            pipeline = [{"$match": match_conditions}, {"$sort": {"upload_date": -1, "_id": -1}}]
+        pipeline.append({"$limit": limit + 1})  # 다음 페이지 존재 여부 확인용으로 하나 더
+        if not relevance:
+            pipeline.append(score_field)  # 최신순이면 반환할 문서의 점수만 계산
+        pipeline.append(project_stage)
+
+        results = data_collection.aggregate(pipeline, batchSize=min(limit + 1, 10))
 
-        results = list(data_collection.aggregate(pipeline))
+        if stream:
+            return Response(stream_with_context(stream_search_results(results, limit)), mimetype="application/x-ndjson")
 
         search_results = []
+        last_result = None
+        has_more = False
         for result in results:
-            image_url = fetch_image_url(result.get('image_id'))
+            if len(search_results) == limit:
+                has_more = True
+                break
+            search_results.append(format_search_result(result))
+            last_result = result
+        results.close()
 
-            search_results.append({
-                "filename": result['filename'],
-                "summary": result['summary'],
-                "upload_date": result['upload_date'].strftime("%Y-%m-%d %H:%M:%S"),
-                "image_url": image_url,
-                "formatted_data": result['formatted_data']
-            })
+        next_cursor = encode_cursor(last_result, relevance) if has_more else None
+        return jsonify({"results": search_results, "limit": limit, "has_more": has_more, "next_cursor": next_cursor})
 
-        return jsonify({"results": search_results})
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         print(f"Error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-def fetch_image_url(image_id):
-    """Fetch image from GridFS and return base64 URL."""
-    if not image_id:
-        return None
-
+def stream_search_results(results, limit):
+    """aggregation 커서에서 나오는 대로 결과를 NDJSON 한 줄씩 내보내고, 마지막 줄에 다음 커서 정보 전송"""
+    count = 0
+    last_result = None
+    has_more = False
     try:
-        image_data = fs.get(image_id).read()
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-        return f"data:image/jpeg;base64,{image_base64}"
+        for result in results:
+            if count == limit:
+                has_more = True
+                break
+            yield json.dumps({"result": format_search_result(result)}, ensure_ascii=False) + "\n"
+            count += 1
+            last_result = result
     except Exception as e:
-        print(f"Image fetch error: {str(e)}")
-        return None
+        print(f"Error: {str(e)}")
+        yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+        return
+    finally:
+        results.close()
+
+    next_cursor = encode_cursor(last_result) if has_more else None
+    yield json.dumps({"limit": limit, "has_more": has_more, "next_cursor": next_cursor}) + "\n"
+
+def build_image_urls(image_id):
+    """원본 이미지와 썸네일 URL 반환 (이미지는 /image 엔드포인트에서 따로 받아감)"""
+    if not image_id:
+        return None, None
+
+    image_url = url_for('images.image_route', image_id=str(image_id), _external=True)
+    thumbnail_url = url_for('images.thumbnail_route', image_id=str(image_id), _external=True)
+    return image_url, thumbnail_url
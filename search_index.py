@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+from array import array
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 잠금 없이 동작 (프로세스 하나로 실행해야 함)
+    fcntl = None
+
+# 로컬 검색 인덱스 저장 디렉토리
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", "search_index")
+# 저널에 쌓인 문서 수가 이 값을 넘으면 스냅샷으로 합침
+SEARCH_INDEX_COMPACT_EVERY = int(os.getenv("SEARCH_INDEX_COMPACT_EVERY", "200"))
+
+
+def index_ngrams(text):
+    """정규화된 텍스트의 글자 단위 1~3-gram 집합 (공백이 포함된 조각 제외)"""
+    grams = set()
+    for n in (1, 2, 3):
+        grams.update(text[i:i + n] for i in range(len(text) - n + 1) if ' ' not in text[i:i + n])
+    return grams
+
+
+def keyword_ngrams(keyword):
+    """검색어 하나를 포함하는 문서라면 반드시 가지고 있는 n-gram 목록 (가능한 긴 n-gram 사용)"""
+    n = min(len(keyword), 3)
+    grams = {keyword[i:i + n] for i in range(len(keyword) - n + 1) if ' ' not in keyword[i:i + n]}
+    if not grams:
+        # 공백 때문에 3-gram을 만들 수 없으면 단어별로 다시 계산
+        grams = {gram for word in keyword.split(' ') if word for gram in keyword_ngrams(word)}
+    return sorted(grams)
+
+
+class NgramIndex:
+    """data 문서의 search_text에 대한 글자 n-gram 역색인
+
+    문서는 추가 순서대로 번호(ordinal)를 받고, 각 n-gram의 포스팅 리스트는 정렬된 uint32 배열이다.
+    디스크에는 스냅샷(index.json + postings.bin + upload_ts.bin)과 이후 추가분 저널(journal.jsonl)로 저장한다.
+
+    디버그 리로더나 여러 워커처럼 같은 디렉토리를 여러 프로세스가 쓰는 경우를 위해
+    저널 추가와 스냅샷 교체는 index.lock 파일 잠금(fcntl) 안에서만 하고, 각 프로세스는 검색 전에
+    다른 프로세스가 추가한 저널 항목을 읽어 반영한다 (스냅샷이 바뀌었으면 다시 로드).
+    스냅샷 합치기는 요청 스레드가 아닌 백그라운드 스레드에서 실행한다.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._compact_requested = threading.Event()
+        self._compactor = None
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(self._path("index.lock"), "a")
+        self._reset()
+        self.load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _reset(self):
+        self.doc_ids = []  # ordinal -> data _id 문자열
+        self.doc_ordinals = {}  # data _id 문자열 -> ordinal
+        self.upload_ts = array('d')  # ordinal -> 업로드 시각 (epoch 초)
+        self.postings = {}  # n-gram -> array('I') of ordinals
+        self.journal_size = 0  # 저널의 항목 수
+        self.journal_offset = 0  # 저널에서 이미 반영한 바이트 위치
+        self.snapshot_version = None  # 반영한 스냅샷 파일의 (inode, 수정 시각)
+
+    def _file_lock(self, exclusive):
+        """프로세스 간 잠금 (with 문에서 사용)"""
+        return _FileLock(self._lock_file, exclusive)
+
+    def __contains__(self, data_id):
+        return str(data_id) in self.doc_ordinals
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def add_document(self, data_id, upload_ts, search_text):
+        """문서 하나를 색인 (이미 있는 문서는 무시)"""
+        data_id = str(data_id)
+        grams = sorted(index_ngrams(search_text))
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh()  # 다른 프로세스가 같은 문서를 이미 추가했을 수 있음
+            if data_id in self.doc_ordinals:
+                return
+
+            # 저널에 추가하여 재시작 후에도, 다른 프로세스에서도 보이도록 함
+            with open(self._path("journal.jsonl"), "a", encoding="utf-8") as journal:
+                journal.write(json.dumps({"id": data_id, "ts": upload_ts, "grams": grams}, ensure_ascii=False) + "\n")
+                self.journal_offset = journal.tell()
+            self._add(data_id, upload_ts, grams)
+            self.journal_size += 1
+
+            if self.journal_size >= SEARCH_INDEX_COMPACT_EVERY:
+                self._request_compact()
+
+    def _add(self, data_id, upload_ts, grams):
+        ordinal = len(self.doc_ids)
+        self.doc_ids.append(data_id)
+        self.doc_ordinals[data_id] = ordinal
+        self.upload_ts.append(upload_ts)
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('I')
+            posting.append(ordinal)  # ordinal은 증가하므로 포스팅 리스트는 항상 정렬 상태
+
+    def search(self, keywords, start_ts=None, end_ts=None):
+        """모든 검색어의 n-gram을 가진 문서 _id 목록 반환 (AND, 업로드 시각 범위 필터)
+
+        n-gram이 모두 있어도 검색어가 연속으로 나오지 않을 수 있으므로 결과는 후보이며,
+        실제 포함 여부는 호출하는 쪽에서 확인한다.
+        """
+        self.refresh()
+        grams = sorted({gram for keyword in keywords for gram in keyword_ngrams(keyword)})
+        with self._lock:
+            postings = []
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    return []
+                postings.append(np.frombuffer(posting, dtype=np.uint32).copy())
+            upload_ts = np.frombuffer(self.upload_ts, dtype=np.float64).copy()
+            doc_ids = list(self.doc_ids)
+
+        if postings:
+            # 짧은 포스팅 리스트부터 교집합
+            postings.sort(key=len)
+            candidates = postings[0]
+            for posting in postings[1:]:
+                candidates = np.intersect1d(candidates, posting, assume_unique=True)
+                if not len(candidates):
+                    return []
+        else:
+            candidates = np.arange(len(doc_ids), dtype=np.uint32)
+
+        if start_ts is not None:
+            candidates = candidates[upload_ts[candidates] >= start_ts]
+        if end_ts is not None:
+            candidates = candidates[upload_ts[candidates] < end_ts]
+        return [doc_ids[ordinal] for ordinal in candidates]
+
+    def refresh(self):
+        """다른 프로세스가 추가한 문서 반영 (파일이 바뀌지 않았으면 잠금 없이 바로 반환)"""
+        with self._lock:
+            if self._snapshot_stat() == self.snapshot_version and self._journal_bytes() == self.journal_offset:
+                return
+            with self._file_lock(exclusive=False):
+                self._refresh()
+
+    def _refresh(self):
+        """스냅샷이 바뀌었으면 다시 로드하고, 아니면 저널에서 아직 읽지 않은 부분만 반영 (파일 잠금 안에서 호출)"""
+        if self._snapshot_stat() != self.snapshot_version or self._journal_bytes() < self.journal_offset:
+            self._reset()
+            self._load_snapshot()
+        self._replay_journal()
+
+    def _snapshot_stat(self):
+        try:
+            stat = os.stat(self._path("index.json"))
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _journal_bytes(self):
+        try:
+            return os.path.getsize(self._path("journal.jsonl"))
+        except OSError:
+            return 0
+
+    def _request_compact(self):
+        """백그라운드 스레드에 스냅샷 합치기 요청"""
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_loop, name="search-index-compactor", daemon=True)
+            self._compactor.start()
+        self._compact_requested.set()
+
+    def _compact_loop(self):
+        while True:
+            self._compact_requested.wait()
+            self._compact_requested.clear()
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error compacting search index: {str(e)}")
+
+    def compact(self):
+        """현재 인덱스 전체를 스냅샷으로 저장하고 저널 비우기"""
+        with self._lock, self._file_lock(exclusive=True):
+            # 다른 프로세스가 추가한 문서까지 반영한 뒤 저장 (이미 다른 프로세스가 합쳤으면 할 일 없음)
+            self._refresh()
+            if self.journal_size < SEARCH_INDEX_COMPACT_EVERY:
+                return
+
+            grams = {}
+            offset = 0
+            with open(self._path("postings.bin.tmp"), "wb") as postings_file:
+                for gram, posting in self.postings.items():
+                    posting.tofile(postings_file)
+                    grams[gram] = [offset, len(posting)]
+                    offset += len(posting)
+            with open(self._path("upload_ts.bin.tmp"), "wb") as ts_file:
+                self.upload_ts.tofile(ts_file)
+            with open(self._path("index.json.tmp"), "w", encoding="utf-8") as index_file:
+                json.dump({"doc_ids": self.doc_ids, "grams": grams}, index_file, ensure_ascii=False)
+
+            # 모든 파일을 쓴 뒤 교체 (index.json을 마지막에 바꿔서 읽는 쪽이 항상 완전한 스냅샷을 보도록)
+            os.replace(self._path("postings.bin.tmp"), self._path("postings.bin"))
+            os.replace(self._path("upload_ts.bin.tmp"), self._path("upload_ts.bin"))
+            os.replace(self._path("index.json.tmp"), self._path("index.json"))
+            open(self._path("journal.jsonl"), "w").close()
+            self.journal_size = 0
+            self.journal_offset = 0
+            self.snapshot_version = self._snapshot_stat()
+
+    def load(self):
+        """디스크의 스냅샷과 저널을 읽어 인덱스 복원"""
+        with self._lock, self._file_lock(exclusive=False):
+            self._reset()
+            self._load_snapshot()
+            self._replay_journal()
+
+    def _load_snapshot(self):
+        index_path = self._path("index.json")
+        self.snapshot_version = self._snapshot_stat()
+        if self.snapshot_version is None:
+            return
+
+        with open(index_path, "r", encoding="utf-8") as index_file:
+            meta = json.load(index_file)
+        all_postings = array('I')
+        with open(self._path("postings.bin"), "rb") as postings_file:
+            all_postings.frombytes(postings_file.read())
+        with open(self._path("upload_ts.bin"), "rb") as ts_file:
+            self.upload_ts.frombytes(ts_file.read())
+
+        self.doc_ids = meta["doc_ids"]
+        self.doc_ordinals = {data_id: ordinal for ordinal, data_id in enumerate(self.doc_ids)}
+        self.postings = {
+            gram: all_postings[offset:offset + count] for gram, (offset, count) in meta["grams"].items()
+        }
+
+    def _replay_journal(self):
+        """저널에서 journal_offset 이후의 완전한 줄만 반영"""
+        journal_path = self._path("journal.jsonl")
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, "rb") as journal:
+            journal.seek(self.journal_offset)
+            for line in journal:
+                if not line.endswith(b"\n"):
+                    break  # 쓰다 만 마지막 줄은 다음에 다시 읽음
+                self.journal_offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry["id"] not in self.doc_ordinals:
+                    self._add(entry["id"], entry["ts"], entry["grams"])
+                self.journal_size += 1
+
+
+class _FileLock:
+    """fcntl.flock을 with 문으로 사용하기 위한 도우미 (fcntl이 없으면 아무 일도 하지 않음)"""
+
+    def __init__(self, lock_file, exclusive):
+        self.lock_file = lock_file
+        self.exclusive = exclusive
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+
+
+search_index = NgramIndex(SEARCH_INDEX_DIR)
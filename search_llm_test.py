@@ -1,8 +1,9 @@
-from models import data_collection, api_key, call_gpt_api
+from models import data_collection, call_gpt_api, to_epoch, document_type
+from embeddings import embed_texts
+from chunking import chunk_text
+from query_filters import build_search_filters
+from hybrid_search import metadata_filter
 import chromadb
-import requests
-from datetime import datetime
-import pytz
 
 collection_name = "ocr-vector"
 
@@ -14,54 +15,53 @@ collection = chroma_client.get_or_create_collection(name=collection_name)
 print(chroma_client.list_collections())
 
 def generate_embedding(text):
-    """OpenAI API를 사용하여 텍스트 임베딩 생성""" 
-    url = "https://api.openai.com/v1/embeddings"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "input": text,
-        "model": "text-embedding-ada-002",
-        "encoding_format": "float"
-    }
-    
+    """OpenAI API를 사용하여 텍스트 임베딩 생성 (디스크 캐시에 있으면 재사용)"""
     try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()  # 응답 오류가 있는 경우 예외 발생
-        embedding = response.json()
-        return embedding['data'][0]['embedding']  # 임베딩 값 반환
-    
+        return embed_texts([text])[0]  # 임베딩 값 반환
+
     except Exception as e:
         print(f"임베딩 처리 중 오류 발생: {str(e)}")
         return None
 
 def save_document(upload_id):
-    """문서를 컬렉션에 저장"""
+    """문서를 페이지/문단 단위 청크로 나누어 컬렉션에 저장"""
     original_doc = data_collection.find_one({"upload_id": upload_id})
     if not original_doc:
         print("문서를 찾을 수 없습니다.")
         return
 
     ocr_text = original_doc.get("ocr_text")
+    chunks = chunk_text(ocr_text)
 
-    # 텍스트 임베딩 생성
-    ocr_embedding = generate_embedding(ocr_text)
+    # 청크 임베딩 생성 (한 번의 배치 요청)
+    try:
+        chunk_embeddings = embed_texts([chunk["text"] for chunk in chunks])
+    except Exception as e:
+        print(f"임베딩 처리 중 오류 발생: {str(e)}")
+        chunk_embeddings = None
 
-    if ocr_embedding is not None:
+    if chunk_embeddings is not None:
         # 문서 저장
         collection.add(
-            documents=[ocr_text],
-            embeddings=[ocr_embedding],
-            metadatas=[{"upload_id": upload_id}],
-            ids=[str(original_doc["_id"])],
+            documents=[chunk["text"] for chunk in chunks],
+            embeddings=chunk_embeddings,
+            metadatas=[
+                {
+                    "upload_id": upload_id, "page": chunk["page"], "start": chunk["start"], "end": chunk["end"],
+                    "data_id": str(original_doc["_id"]),
+                    "upload_ts": to_epoch(original_doc["upload_date"]),
+                    "doc_type": document_type(original_doc.get("formatted_data")),
+                }
+                for chunk in chunks
+            ],
+            ids=[f"{original_doc['_id']}:{index}" for index in range(len(chunks))],
         )
-        print(f"Document with upload_id {upload_id} saved successfully.")
+        print(f"Document with upload_id {upload_id} saved successfully ({len(chunks)} chunks).")
     else:
         print("임베딩 생성 실패")
 
-def query_documents(query_text):
-    """쿼리 텍스트로 유사 문서 검색"""
+def query_documents(query_text, where=None):
+    """쿼리 텍스트로 유사 문서 검색 (where가 주어지면 메타데이터 조건에 맞는 청크 중에서만 검색)"""
     query_embedding = generate_embedding(query_text)
     if query_embedding is None:
         print("쿼리 임베딩 생성 실패")
@@ -70,7 +70,8 @@ def query_documents(query_text):
     try:
         results = collection.query(
             query_embeddings=[query_embedding],
-            n_results=2  # 결과 수
+            n_results=2,  # 결과 수
+            where=where
         )
         print("Search results:", results)
         return(results)
@@ -78,36 +79,14 @@ def query_documents(query_text):
         print(f"Chroma 검색 중 오류 발생: {str(e)}")
 
 def generate_query(query_text):
-    """GPT API를 사용하여 자연어 쿼리를 특정 쿼리로 변환"""
+    """자연어 쿼리를 검색 문장과 Chroma where 조건으로 변환 (날짜, 파일명, 문서 종류)"""
     try:
-        # 현재 한국 표준시(KST) 시간 가져오기
-        now = datetime.now(pytz.timezone('Asia/Seoul'))
-        datenow = now.strftime("%Y년 %m월 %d일 %H:%M:%S")
-
-        # 쿼리문 생성 페이로드
-        query_payload = {
-            "model": "gpt-4o-mini",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": (
-                        f"다음 내용을 ChromaDB 쿼리 작성을 위해 쉽게 임베딩 할 수 있도록 개조식으로 표현해줘. "
-                        f"시간 관련 내용이 있다면 {datenow} 현재 시간을 참고하여 절대 시각으로 표현해줘. "
-                        f"예를 들어, '지난달 문서'는 '2024년 10월에 업로드된 문서'로 변환될 수 있어. "
-                        f"최종 텍스트 이외에 출력 금지 :\n\n{query_text}"
-                        )
-                }
-            ],
-            "max_tokens": 100
-        }
-
-        # GPT-4o mini API로 요약 요청
-        query = call_gpt_api(query_payload)
-        return query
+        search_query, filters = build_search_filters(query_text)
+        return search_query, metadata_filter(filters)
     
     except Exception as e:
         print(f"쿼리 변환 중 오류 발생: {str(e)}")
-        return None
+        return query_text, None
 
 def generate_answer(results, user_query):
     """검색된 문서와 사용자 질문을 바탕으로 GPT API를 사용하여 답변 생성"""
@@ -146,9 +125,9 @@ if __name__ == "__main__":
     # 테스트할 upload_id를 입력하세요
     upload_id = "672265dd988431d78fc1efdf"  # 예시 업로드 ID로 대체하세요
     # save_document(upload_id)  # 문서 저장
-    query = generate_query("지난달 업로드한 헌혈 문서")
-    print(query)
-    results = query_documents(query)  # 쿼리 검색
+    query, where = generate_query("지난달 업로드한 헌혈 문서")
+    print(query, where)
+    results = query_documents(query, where)  # 쿼리 검색
     user_question="봉사를 한 사람이 누구고 주소가 어떻게 돼?"
     answer = generate_answer(results, user_question)
     print("GPT 응답 : ", answer)
@@ -1,10 +1,24 @@
 from flask import Blueprint, request, jsonify
 from models import upload_collection, save_db_data
 from bson import ObjectId
-from models import summarize_text, format_data, parse_formatted_data
+from models import summarize_text, format_data, parse_formatted_data, summarize_and_format_text
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
 
 summarize_and_format = Blueprint('summarize_and_format', __name__)
 
+# 요약과 정형화를 한 번의 요청으로 처리할지 여부 (요청 본문의 fused 값이 우선)
+SUMMARIZE_FUSED = os.getenv("SUMMARIZE_FUSED", "0") == "1"
+
+summarize_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SUMMARIZE_WORKERS", "8")))
+
+def timed(func, *args):
+    """함수를 실행하고 (결과, 소요 시간 ms)를 반환"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
 @summarize_and_format.route('/summarize_and_format', methods=['POST'])
 def summarize_and_format_route():
     try:
@@ -17,8 +31,19 @@ def summarize_and_format_route():
         if not upload_id:
             return jsonify({"error": "업로드 ID가 필요합니다."}), 400
 
-        summary = summarize_text(ocr_text)
-        formatted_data_str = format_data(ocr_text)
+        start = time.perf_counter()
+        if data.get('fused', SUMMARIZE_FUSED):
+            # 요약과 정형화를 한 번의 요청으로 처리
+            (summary, formatted_data_str), fused_ms = timed(summarize_and_format_text, ocr_text)
+            timings = {"fused_ms": fused_ms}
+        else:
+            # 서로 독립적인 요약/정형화 요청을 동시에 실행
+            summary_future = summarize_executor.submit(timed, summarize_text, ocr_text)
+            format_future = summarize_executor.submit(timed, format_data, ocr_text)
+            summary, summarize_ms = summary_future.result()
+            formatted_data_str, format_ms = format_future.result()
+            timings = {"summarize_ms": summarize_ms, "format_ms": format_ms}
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
         formatted_data = parse_formatted_data(formatted_data_str)
 
         # upload 컬렉션에서 정보 가져오기
@@ -26,10 +51,11 @@ def summarize_and_format_route():
         if upload_info:
             filename = upload_info['filename']
             image_id = upload_info['image_id']
+            pages = upload_info.get('pages')
             upload_date = upload_info['upload_date']
 
             # data 컬렉션에 데이터 저장
-            save_db_data(upload_id, filename, ocr_text, summary, formatted_data, upload_date, image_id)
+            save_db_data(upload_id, filename, ocr_text, summary, formatted_data, upload_date, image_id, pages)
 
             response_html = f"""
             <div>
@@ -40,7 +66,7 @@ def summarize_and_format_route():
             </div>
             """
 
-            return jsonify({"html": response_html})
+            return jsonify({"html": response_html, "timings": timings})
 
     except Exception as e:
         print(f"Error in summarize_and_format: {str(e)}")